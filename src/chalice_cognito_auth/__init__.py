@@ -1,5 +1,9 @@
 __version__ = '2.5.1'
 
+# Imported first so that, when enabled, the import hook is installed before
+# any of the heavier dependencies are loaded.
+from chalice_cognito_auth import coldstart  # noqa
+
 
 def default_user_pool_handler():
     from chalice_cognito_auth.userpool import UserPoolHandler
@@ -1,11 +1,20 @@
 from chalice import AuthResponse
+from chalice import AuthRoute
 
+from chalice_cognito_auth.cache import InMemoryCache
+from chalice_cognito_auth.claims import get_groups
+from chalice_cognito_auth.claims import get_scopes
 from chalice_cognito_auth.exceptions import InvalidToken
 from chalice_cognito_auth.decoder import TokenDecoder
+from chalice_cognito_auth.profiling import profiler
+
+
+_ALL_HTTP_METHODS = frozenset(AuthResponse.ALL_HTTP_METHODS)
 
 
 class UserPoolAuthorizer:
-    def __init__(self, decoder, route_selector=None, principal_selector=None):
+    def __init__(self, decoder, route_selector=None, principal_selector=None,
+                 policy_cache=None):
         self._decoder = decoder
 
         if route_selector is None:
@@ -16,20 +25,90 @@ class UserPoolAuthorizer:
             principal_selector = UsernameSelector()
         self._principal_selector = principal_selector
 
+        if policy_cache is None:
+            policy_cache = InMemoryCache()
+        self._policy_cache = policy_cache
+
     @classmethod
     def from_env(cls) -> 'UserPoolAuthorizer':
         return cls(decoder=TokenDecoder.from_env())
 
+    @profiler.profile
     def auth_handler(self, auth_request):
-        token = auth_request.token
         try:
-            claims = self._decoder.decode(token)
-            return AuthResponse(
-                self._route_selector.get_allowed_routes(claims),
-                principal_id=self._principal_selector.get_principal(claims),
+            routes, principal_id, _ = self.authorize(auth_request.token)
+            return CachedAuthResponse(
+                routes, principal_id=principal_id,
+                policy_cache=self._policy_cache,
             )
         except InvalidToken:
-            return AuthResponse(routes=[], principal_id=None)
+            return CachedAuthResponse(
+                routes=[], principal_id=None, policy_cache=self._policy_cache)
+
+    def get_claims(self, token):
+        return self._decoder.decode(token)
+
+    def authorize(self, token):
+        claims = self._decoder.decode(token)
+        routes = self._route_selector.get_allowed_routes(claims)
+        principal_id = self._principal_selector.get_principal(claims)
+        return routes, principal_id, claims
+
+
+class CachedAuthResponse(AuthResponse):
+    """CachedAuthResponse
+
+    An ``AuthResponse`` whose allowed resources are cached by route set and
+    API stage. They do not depend on the principal, so they are shared by
+    every caller allowed the same routes. The cache holds them as a tuple
+    and each response gets its own policy document built from it. Routes
+    that allow every HTTP method are collapsed into a single wildcard
+    resource, which keeps the policies small enough for API Gateway to
+    cache them.
+    """
+    def __init__(self, routes, principal_id, context=None, policy_cache=None):
+        super().__init__(routes, principal_id, context=context)
+        self._policy_cache = policy_cache
+
+    def _generate_policy(self, request):
+        if self._policy_cache is None:
+            return super()._generate_policy(request)
+        routes = tuple(self._normalize(route) for route in self.routes)
+        key = (routes, self._get_stage_arn(request.method_arn))
+        resources = self._policy_cache.get(key)
+        if resources is None:
+            resources = tuple(AuthResponse(
+                [self._to_route(route) for route in routes], None,
+            )._generate_allowed_resources(request))
+            self._policy_cache.set(key, resources, float('inf'))
+        return {
+            'Version': '2012-10-17',
+            'Statement': [
+                {
+                    'Action': 'execute-api:Invoke',
+                    'Effect': 'Allow',
+                    'Resource': list(resources),
+                }
+            ]
+        }
+
+    def _normalize(self, route):
+        if isinstance(route, str):
+            return route
+        methods = tuple(route.methods)
+        if _ALL_HTTP_METHODS.issubset(methods):
+            return route.path
+        return (route.path, methods)
+
+    def _to_route(self, route):
+        if isinstance(route, str):
+            return route
+        return AuthRoute(route[0], list(route[1]))
+
+    def _get_stage_arn(self, method_arn):
+        # arn:<partition>:execute-api:<region>:<account>:<api-id>/<stage>/...
+        arn_parts = method_arn.split(':', 5)
+        return tuple(arn_parts[:5]) + tuple(arn_parts[-1].split('/', 2)[:2])
 
 
 class RouteSelector:
@@ -42,6 +121,58 @@ class AllRoutes(RouteSelector):
         return ['*']
 
 
+class GroupRouteSelector(RouteSelector):
+    """GroupRouteSelector
+
+    Allows the routes mapped to any of the token's ``cognito:groups`` or
+    ``scope`` values. The mappings are compiled into an index once, and the
+    allowed routes are memoized per distinct combination of matching groups
+    and scopes. The returned tuples are shared and must not be modified.
+    """
+    def __init__(self, group_routes=None, scope_routes=None):
+        self._routes = []
+        positions = {}
+        self._group_index = self._compile(group_routes, positions)
+        self._scope_index = self._compile(scope_routes, positions)
+        self._allowed = {}
+
+    def _compile(self, mapping, positions):
+        index = {}
+        for name, routes in (mapping or {}).items():
+            indices = set()
+            for route in routes:
+                key = self._route_key(route)
+                if key not in positions:
+                    positions[key] = len(self._routes)
+                    self._routes.append(route)
+                indices.add(positions[key])
+            index[name] = frozenset(indices)
+        return index
+
+    def _route_key(self, route):
+        if isinstance(route, str):
+            return route
+        return (route.path, tuple(route.methods))
+
+    def get_allowed_routes(self, claims):
+        groups = get_groups(claims).intersection(self._group_index)
+        scopes = get_scopes(claims).intersection(self._scope_index)
+        key = (groups, scopes)
+        routes = self._allowed.get(key)
+        if routes is None:
+            routes = self._build_routes(groups, scopes)
+            self._allowed[key] = routes
+        return routes
+
+    def _build_routes(self, groups, scopes):
+        indices = set()
+        for group in groups:
+            indices.update(self._group_index[group])
+        for scope in scopes:
+            indices.update(self._scope_index[scope])
+        return tuple(self._routes[i] for i in sorted(indices))
+
+
 class PrincipalSelector:
     def get_principal(self, claims):
         raise NotImplementedError('get_principal')
@@ -49,4 +180,8 @@ class PrincipalSelector:
 
 class UsernameSelector(PrincipalSelector):
     def get_principal(self, claims):
-        return claims.get('cognito:username')
+        username = claims.get('cognito:username')
+        if username is None:
+            # Access tokens name the user in the username claim.
+            username = claims.get('username')
+        return username
@@ -1,10 +1,22 @@
+import io
 import sys
 
+from chalice import BadRequestError
 from chalice import Blueprint
+from chalice import ForbiddenError
 from chalice import Response
+from chalice import UnauthorizedError
 
+from chalice_cognito_auth import coldstart
+from chalice_cognito_auth.claims import get_groups
 from chalice_cognito_auth.exceptions import InvalidAuthHandlerNameError
 from chalice_cognito_auth.exceptions import ChallengeError
+from chalice_cognito_auth.exceptions import InvalidToken
+from chalice_cognito_auth.constants import MAX_BULK_REGISTER_USERS
+from chalice_cognito_auth.constants import DEFAULT_USERS_EXPORT_LIMIT
+from chalice_cognito_auth.constants import MAX_USERS_EXPORT_LIMIT
+from chalice_cognito_auth.constants import LIST_USERS_PAGE_SIZE
+from chalice_cognito_auth.constants import JWKS_CACHE_MAX_AGE
 from chalice_cognito_auth.utils import get_param
 from chalice_cognito_auth.utils import handle_client_errors
 from chalice_cognito_auth.utils import is_running_on_lambda
@@ -23,11 +35,17 @@ class BlueprintFactory:
     def from_env(cls) -> 'BlueprintFactory':
         return cls()
 
-    def create_blueprint(self, name, authorizer, lifecycle, cors=False):
+    def create_blueprint(self, name, authorizer, lifecycle, cors=False,
+                         middleware=None, bulk_register=None,
+                         export_users=None, key_fetcher=None):
         if name in vars(sys.modules[__name__]):
             raise InvalidAuthHandlerNameError(name)
+        register_groups = _get_allowed_groups('bulk_register', bulk_register)
+        export_groups = _get_allowed_groups('export_users', export_users)
 
         routes = Blueprint('%s' % __name__)
+        if middleware is not None:
+            middleware.register(routes)
 
         extra_kwargs = {}
         if cors is True:
@@ -48,6 +66,33 @@ class BlueprintFactory:
             body.pop('password')
             return lifecycle.register(username, password, body)
 
+        if register_groups is not None:
+            @routes.route('/register/bulk', methods=['POST'], authorizer=auth,
+                          **extra_kwargs)
+            def register_bulk():
+                request = routes.current_request
+                _require_groups(authorizer, request, register_groups)
+                body = request.json_body
+                users = get_param(body, 'users', required=True)
+                if not isinstance(users, list) or not all(
+                        isinstance(user, dict) for user in users):
+                    raise BadRequestError('users must be a list of objects')
+                if len(users) > MAX_BULK_REGISTER_USERS:
+                    raise BadRequestError(
+                        'At most %s users can be registered at once'
+                        % MAX_BULK_REGISTER_USERS)
+                registrations = []
+                for user in users:
+                    properties = dict(user)
+                    username = get_param(
+                        properties, 'username', required=True)
+                    password = get_param(
+                        properties, 'password', required=True)
+                    properties.pop('username')
+                    properties.pop('password')
+                    registrations.append((username, password, properties))
+                return {'results': lifecycle.register_many(registrations)}
+
         @routes.route('/confirm_registration', methods=['POST'], **extra_kwargs)
         @handle_client_errors
         def confirm():
@@ -90,10 +135,86 @@ class BlueprintFactory:
             refresh_token = get_param(body, 'refresh_token', required=True)
             return lifecycle.refresh(refresh_token)
 
+        if export_groups is not None:
+            @routes.route('/users/export', methods=['GET'], authorizer=auth,
+                          **extra_kwargs)
+            @handle_client_errors
+            def users_export():
+                request = routes.current_request
+                _require_groups(authorizer, request, export_groups)
+                params = request.query_params or {}
+                try:
+                    limit = int(params.get(
+                        'limit', DEFAULT_USERS_EXPORT_LIMIT))
+                except ValueError:
+                    raise BadRequestError('limit must be an integer')
+                if not 0 < limit <= MAX_USERS_EXPORT_LIMIT:
+                    raise BadRequestError(
+                        'limit must be between 1 and %s'
+                        % MAX_USERS_EXPORT_LIMIT)
+                # Pages can only be resumed from their start, so the limit
+                # is rounded up to whole pages.
+                max_pages = -(-limit // LIST_USERS_PAGE_SIZE)
+                body = io.StringIO()
+                pagination_token = lifecycle.export_users(
+                    body, params.get('pagination_token'), max_pages=max_pages)
+                headers = {'Content-Type': 'application/x-ndjson'}
+                if pagination_token is not None:
+                    headers['Pagination-Token'] = pagination_token
+                return Response(body=body.getvalue(), headers=headers)
+
+        if key_fetcher is not None:
+            @routes.route('/.well-known/jwks.json', methods=['GET'],
+                          **extra_kwargs)
+            def jwks():
+                body, etag = key_fetcher.get_document()
+                headers = {
+                    'ETag': etag,
+                    'Cache-Control': 'public, max-age=%s' % JWKS_CACHE_MAX_AGE,
+                }
+                request_headers = routes.current_request.headers
+                if _etag_matches(request_headers.get('if-none-match'), etag):
+                    return Response(body='', status_code=304, headers=headers)
+                headers['Content-Type'] = 'application/json'
+                return Response(body=body, headers=headers)
+
         setattr(sys.modules[__name__], name, auth)
         return routes, auth
 
 
+def _get_allowed_groups(option, groups):
+    if groups is None or groups is False:
+        return None
+    if isinstance(groups, (bool, str)) or not groups:
+        raise ValueError(
+            '%s must list the groups allowed to use the route' % option)
+    return frozenset(groups)
+
+
+def _require_groups(authorizer, request, groups):
+    token = request.headers.get('authorization')
+    if not token:
+        raise UnauthorizedError('Missing token')
+    try:
+        claims = authorizer.get_claims(token)
+    except InvalidToken:
+        raise UnauthorizedError('Invalid token')
+    if groups.isdisjoint(get_groups(claims)):
+        raise ForbiddenError('Missing required group')
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate in ('*', etag):
+            return True
+    return False
+
+
 def _import_chalice_app_if_needed():
     # Chalice isn't loaded in an authorizer because the lambda handler string
     # does not load the app.* file. It loads chalice_cognito_auth.blueprint.*
@@ -104,7 +225,9 @@ def _import_chalice_app_if_needed():
     # a circular import.
     if 'app' in sys.modules:
         return
-    import app  # noqa
+    with coldstart.timer.phase('import:app'):
+        import app  # noqa
+    coldstart.timer.emit()
 
 
 if is_running_on_lambda():
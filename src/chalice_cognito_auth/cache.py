@@ -0,0 +1,56 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_MAX_SIZE = 1024
+
+
+def token_digest(token):
+    return hashlib.sha256(str(token).encode('utf-8')).digest()
+
+
+class InMemoryCache:
+    """InMemoryCache
+
+    A bounded least recently used cache where every entry carries its own
+    expiry timestamp. Expired entries are dropped lazily on lookup.
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, now=None):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if now is None:
+            now = time.time
+        self._now = now
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if self._now() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
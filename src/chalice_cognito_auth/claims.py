@@ -0,0 +1,101 @@
+import json
+from collections import namedtuple
+from collections.abc import Mapping
+
+from jose.utils import base64url_decode
+
+
+GROUPS_CLAIM = 'cognito:groups'
+SCOPE_CLAIM = 'scope'
+_MISSING = object()
+
+
+def get_groups(claims):
+    groups = claims.get(GROUPS_CLAIM)
+    if not groups:
+        return frozenset()
+    return frozenset(groups)
+
+
+def get_scopes(claims):
+    scope = claims.get(SCOPE_CLAIM)
+    if not scope:
+        return frozenset()
+    return frozenset(scope.split())
+
+
+class Claims(Mapping):
+    """Claims
+
+    A read only mapping of token claims. Only the claims needed to validate
+    a token, select its principal and match its routes are decoded up front,
+    the rest of the payload is kept as raw JSON until one of the other claims
+    is accessed.
+    """
+    _EAGER_CLAIMS = {
+        'exp': 'exp',
+        'aud': 'aud',
+        'client_id': 'client_id',
+        'iss': 'iss',
+        'token_use': 'token_use',
+        'jti': 'jti',
+        'origin_jti': 'origin_jti',
+        'username': 'username',
+        'cognito:username': 'cognito_username',
+        GROUPS_CLAIM: 'cognito_groups',
+        SCOPE_CLAIM: 'scope',
+    }
+    __slots__ = tuple(_EAGER_CLAIMS.values()) + ('_payload', '_claims')
+
+    def __init__(self, payload):
+        claims = json.loads(payload)
+        if not isinstance(claims, dict):
+            raise ValueError('Claims must be a JSON object')
+        for name, slot in self._EAGER_CLAIMS.items():
+            setattr(self, slot, claims.get(name, _MISSING))
+        self._payload = payload
+        self._claims = None
+
+    @classmethod
+    def from_token(cls, token) -> 'Claims':
+        payload = str(token).split('.')[1]
+        return cls(base64url_decode(payload.encode('utf-8')))
+
+    def __getitem__(self, key):
+        slot = self._EAGER_CLAIMS.get(key)
+        if slot is None:
+            return self._load()[key]
+        value = getattr(self, slot)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __repr__(self):
+        return 'Claims(%r)' % dict(self)
+
+    def _load(self):
+        claims = self._claims
+        if claims is None:
+            # Instances are shared between threads through the token cache.
+            # _claims is always set before _payload is cleared, so a missing
+            # payload means another thread has just finished loading it.
+            payload = self._payload
+            if payload is None:
+                return self._claims
+            claims = json.loads(payload)
+            self._claims = claims
+            self._payload = None
+        return claims
+
+
+ClaimSets = namedtuple('ClaimSets', ['groups', 'scopes'])
+
+
+def get_claim_sets(claims):
+    return ClaimSets(get_groups(claims), get_scopes(claims))
@@ -0,0 +1,52 @@
+import threading
+
+from chalice_cognito_auth import coldstart
+from chalice_cognito_auth.constants import COGNITO_MAX_POOL_CONNECTIONS_ENV_VAR
+from chalice_cognito_auth.utils import env_var
+
+
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+
+
+class ClientRegistry:
+    """ClientRegistry
+
+    Creates one ``cognito-idp`` client per region the first time it is
+    needed and shares it between everything that asks for that region.
+    ``boto3`` itself is only imported when the first client is created.
+    """
+    def __init__(self, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS):
+        self._max_pool_connections = max_pool_connections
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'ClientRegistry':
+        return cls(max_pool_connections=int(env_var(
+            COGNITO_MAX_POOL_CONNECTIONS_ENV_VAR,
+            str(DEFAULT_MAX_POOL_CONNECTIONS),
+        )))
+
+    def get_client(self, region):
+        client = self._clients.get(region)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(region)
+                if client is None:
+                    client = self._create_client(region)
+                    self._clients[region] = client
+        return client
+
+    def _create_client(self, region):
+        with coldstart.timer.phase('create_cognito_client'):
+            import boto3
+            from botocore.config import Config
+            return boto3.client(
+                'cognito-idp',
+                region_name=region,
+                config=Config(
+                    max_pool_connections=self._max_pool_connections),
+            )
+
+
+registry = ClientRegistry.from_env()
@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import logging
+import functools
+import contextlib
+import importlib.util
+from importlib.abc import Loader
+from importlib.abc import MetaPathFinder
+
+from chalice_cognito_auth.constants import COLD_START_TIMING_ENV_VAR
+
+
+LOG = logging.getLogger(__name__)
+WATCHED_IMPORTS = (
+    'boto3',
+    'botocore',
+    'chalice',
+    'cryptography',
+    'jose',
+)
+
+
+class ColdStartTimer:
+    """ColdStartTimer
+
+    Records how long the import and initialization phases of a container
+    take and logs them once as a single JSON line. Phases can be nested, the
+    summary is only emitted once no phase is running, so phases that happen
+    while the app module is imported are included in the same line.
+    """
+    def __init__(self, enabled=False, clock=None, logger=None):
+        self.enabled = enabled
+        if clock is None:
+            clock = time.perf_counter
+        self._clock = clock
+        if logger is None:
+            logger = LOG
+        self._logger = logger
+        self._started = clock()
+        self._phases = {}
+        self._depth = 0
+        self._emitted = False
+
+    @classmethod
+    def from_env(cls, env=os.environ) -> 'ColdStartTimer':
+        # utils.env_var is not used here since importing utils would load
+        # chalice and botocore before the import hook is installed.
+        return cls(enabled=env.get(COLD_START_TIMING_ENV_VAR) == '1')
+
+    @property
+    def phases(self):
+        return dict(self._phases)
+
+    def record(self, name, duration):
+        self._phases[name] = self._phases.get(name, 0) + duration
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = self._clock()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.record(name, self._clock() - start)
+
+    def timed(self, name):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapped(*args, **kwargs):
+                with self.phase(name):
+                    result = fn(*args, **kwargs)
+                self.emit()
+                return result
+            return wrapped
+        return decorator
+
+    def emit(self):
+        if not self.enabled or self._emitted or self._depth:
+            return
+        self._emitted = True
+        self._logger.info(json.dumps({
+            'cold_start': {
+                'total_ms': (self._clock() - self._started) * 1000,
+                'phases_ms': {
+                    name: duration * 1000
+                    for name, duration in sorted(self._phases.items())
+                },
+            },
+        }))
+
+    def install_import_hook(self, modules=WATCHED_IMPORTS):
+        sys.meta_path.insert(0, _ImportTimer(self, modules))
+
+
+class _ImportTimer(MetaPathFinder):
+    # Imports of a watched package and its submodules are attributed to the
+    # top level package. Only the outermost watched import is timed, so a
+    # package imported by another watched package counts towards the one
+    # that imported it.
+    def __init__(self, timer, packages):
+        self._timer = timer
+        self._packages = frozenset(packages)
+        self._finding = set()
+        self.active = False
+
+    def find_spec(self, fullname, path=None, target=None):
+        package = fullname.partition('.')[0]
+        if package not in self._packages or fullname in self._finding:
+            return None
+        self._finding.add(fullname)
+        try:
+            spec = importlib.util.find_spec(fullname)
+        finally:
+            self._finding.discard(fullname)
+        if spec is None or spec.loader is None:
+            return spec
+        spec.loader = _TimedLoader(spec.loader, self, package)
+        return spec
+
+    def exec_module(self, loader, module, package):
+        if self.active:
+            loader.exec_module(module)
+            return
+        self.active = True
+        try:
+            with self._timer.phase('import:%s' % package):
+                loader.exec_module(module)
+        finally:
+            self.active = False
+
+
+class _TimedLoader(Loader):
+    def __init__(self, loader, import_timer, package):
+        self._loader = loader
+        self._import_timer = import_timer
+        self._package = package
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._import_timer.exec_module(self._loader, module, self._package)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+timer = ColdStartTimer.from_env()
+if timer.enabled:
+    LOG.setLevel(logging.INFO)
+    timer.install_import_hook()
@@ -3,3 +3,16 @@ USER_POOL_ID_ENV_VAR = 'POOL_ID'
 REGION_ENV_VAR = 'AWS_REGION'
 USER_POOL_HANDLER_NAME_ENV_VAR = 'USER_POOL_HANDLER_NAME'
 DEFAULT_USER_POOL_HANDLER_NAME = 'UserPoolAuth'
+PROFILE_SAMPLE_RATE_ENV_VAR = 'CHALICE_COGNITO_AUTH_PROFILE_SAMPLE_RATE'
+PROFILE_TOP_N_ENV_VAR = 'CHALICE_COGNITO_AUTH_PROFILE_TOP_N'
+PROFILE_REPORT_EVERY_ENV_VAR = 'CHALICE_COGNITO_AUTH_PROFILE_REPORT_EVERY'
+PROFILE_TRACEMALLOC_ENV_VAR = 'CHALICE_COGNITO_AUTH_PROFILE_TRACEMALLOC'
+COLD_START_TIMING_ENV_VAR = 'CHALICE_COGNITO_AUTH_COLD_START_TIMING'
+COGNITO_MAX_POOL_CONNECTIONS_ENV_VAR = 'COGNITO_MAX_POOL_CONNECTIONS'
+DEFAULT_BULK_REGISTER_MAX_WORKERS = 10
+DEFAULT_BULK_REGISTER_RATE = 50
+MAX_BULK_REGISTER_USERS = 500
+LIST_USERS_PAGE_SIZE = 60
+DEFAULT_USERS_EXPORT_LIMIT = 1000
+MAX_USERS_EXPORT_LIMIT = 2000
+JWKS_CACHE_MAX_AGE = 300
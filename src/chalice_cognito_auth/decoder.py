@@ -1,34 +1,78 @@
 import time
 import json
+import hashlib
 import urllib.request
 
 from jose import jwt
 from jose import jwk
 from jose.utils import base64url_decode
 
+from chalice_cognito_auth.cache import InMemoryCache
+from chalice_cognito_auth.cache import token_digest
+from chalice_cognito_auth.claims import Claims
 from chalice_cognito_auth.exceptions import InvalidToken
 from chalice_cognito_auth.utils import env_var
+from chalice_cognito_auth.utils import RateLimiter
 from chalice_cognito_auth.constants import REGION_ENV_VAR
 from chalice_cognito_auth.constants import USER_POOL_ID_ENV_VAR
 from chalice_cognito_auth.constants import CLIENT_ID_ENV_VAR
 
 
+DEFAULT_KEYS_MAX_AGE = 3600
+DEFAULT_KEYS_REFRESH_INTERVAL = 60
+
+
 class TokenDecoder:
-    def __init__(self, key_fetcher, app_client_id, now=None):
+    """TokenDecoder
+
+    Verifies tokens against the user pool's keys. A token signed with an
+    unknown key makes the keys be fetched again, at most once every
+    ``keys_refresh_interval`` seconds, so rotated keys are picked up without
+    letting forged ``kid`` values trigger a fetch per request.
+    """
+    def __init__(self, key_fetcher, app_client_id, now=None, cache=None,
+                 revocation_checker=None,
+                 keys_refresh_interval=DEFAULT_KEYS_REFRESH_INTERVAL):
         self._key_fetcher = key_fetcher
         self._app_client_id = app_client_id
+        self._cache = cache
+        self._revocation_checker = revocation_checker
         if now is None:
             now = time.time
         self._now = now
+        self._refresh_limiter = RateLimiter(
+            1.0 / keys_refresh_interval, burst=1, now=now)
 
     @classmethod
     def from_env(cls) -> 'TokenDecoder':
         return cls(
             key_fetcher=KeyFetcher.from_env(),
             app_client_id=env_var(CLIENT_ID_ENV_VAR),
+            cache=InMemoryCache(),
         )
 
     def decode(self, token):
+        if self._cache is None:
+            claims = self._decode(token)
+        else:
+            key = token_digest(token)
+            claims = self._cache.get(key)
+            if claims is None:
+                claims = self._decode(token)
+                self._cache.set(key, claims, claims['exp'])
+        if self._revocation_checker is not None:
+            self._check_revoked(claims)
+        return claims
+
+    def _check_revoked(self, claims):
+        try:
+            revoked = self._revocation_checker.is_revoked(claims)
+        except Exception:
+            raise InvalidToken('Error checking token revocation')
+        if revoked:
+            raise InvalidToken('Token revoked')
+
+    def _decode(self, token):
         try:
             self._verify(token)
             claims = self._get_claims(token)
@@ -49,16 +93,31 @@ class TokenDecoder:
             raise InvalidToken('Signature verification failed')
 
     def _get_key(self, kid):
+        key = self._find_key(kid)
+        if key is None and self._refresh_limiter.try_acquire():
+            self._key_fetcher.refresh()
+            key = self._find_key(kid)
+        if key is None:
+            raise InvalidToken('Could not find kid %s' % kid)
+        return key
+
+    def _find_key(self, kid):
         for key in self._key_fetcher.get_keys():
             if key['kid'] == kid:
                 return key
-        raise InvalidToken('Could not find kid %s' % kid)
+        return None
 
     def _get_claims(self, token):
-        claims = jwt.get_unverified_claims(token)
+        claims = Claims.from_token(token)
         if self._now() > claims['exp']:
             raise InvalidToken('Token expired')
-        if claims['aud'] != self._app_client_id:
+        # Cognito access tokens carry the app client in client_id, only ID
+        # tokens have an aud claim.
+        if claims.get('token_use') == 'access':
+            audience = claims.get('client_id')
+        else:
+            audience = claims.get('aud')
+        if audience != self._app_client_id:
             raise InvalidToken('Token was not issued for this audience')
         return claims
 
@@ -69,13 +128,21 @@ class KeyFetcher:
         '/{user_pool_id}/.well-known/jwks.json'
     )
 
-    def __init__(self, region, user_pool_id, urlopen=None):
+    def __init__(self, region, user_pool_id, urlopen=None, cache=None,
+                 max_age=DEFAULT_KEYS_MAX_AGE, now=None):
         self._region = region
         self._user_pool_id = user_pool_id
         self._keys = None
+        self._keys_expire = 0
+        self._document = None
         if urlopen is None:
             urlopen = urllib.request.urlopen
         self._urlopen = urlopen
+        self._cache = cache
+        self._max_age = max_age
+        if now is None:
+            now = time.time
+        self._now = now
 
     @classmethod
     def from_env(cls) -> 'KeyFetcher':
@@ -84,14 +151,55 @@ class KeyFetcher:
             user_pool_id=env_var(USER_POOL_ID_ENV_VAR),
         )
 
-    def get_keys(self):
-        if self._keys is None:
-            self._keys = self._get_keys()
-        return self._keys
-
-    def _get_keys(self):
-        url = self._KEYS_URL.format(
+    @property
+    def _url(self):
+        return self._KEYS_URL.format(
             region=self._region,
             user_pool_id=self._user_pool_id,
         )
+
+    def get_keys(self):
+        now = self._now()
+        if self._keys is None or now >= self._keys_expire:
+            self._keys = self._get_cached_keys()
+            self._keys_expire = now + self._max_age
+        return self._keys
+
+    def refresh(self):
+        """Fetch the keys again, bypassing the cache, and store them."""
+        url = self._url
+        keys = self._get_keys(url)
+        now = self._now()
+        if self._cache is not None:
+            self._cache.set(url, keys, now + self._max_age)
+        self._keys = keys
+        self._keys_expire = now + self._max_age
+        return keys
+
+    def get_document(self):
+        """Return the JWKS as canonical JSON and its strong ETag.
+
+        Both are computed once per set of keys, so they change as soon as
+        the keys are refreshed.
+        """
+        keys = self.get_keys()
+        document = self._document
+        if document is None or document[0] is not keys:
+            body = json.dumps(
+                {'keys': keys}, sort_keys=True, separators=(',', ':'))
+            etag = '"%s"' % hashlib.sha256(body.encode('utf-8')).hexdigest()
+            document = self._document = (keys, body, etag)
+        return document[1], document[2]
+
+    def _get_cached_keys(self):
+        url = self._url
+        if self._cache is None:
+            return self._get_keys(url)
+        keys = self._cache.get(url)
+        if keys is None:
+            keys = self._get_keys(url)
+            self._cache.set(url, keys, self._now() + self._max_age)
+        return keys
+
+    def _get_keys(self, url):
         return json.loads(self._urlopen(url).read())['keys']
@@ -30,3 +30,11 @@ class MissingEnvironmentVariableError(Exception):
 
     def __str__(self) -> str:
         return f'Could not find required environment variable: "{self.name}".'
+
+
+class RevocationListUnavailableError(Exception):
+    """RevocationListUnavailableError
+
+    Raised when revoked token ids have never been loaded from the store, so
+    no token can be checked.
+    """
@@ -0,0 +1,298 @@
+import io
+import json
+import time
+import uuid
+import threading
+
+from botocore.exceptions import ClientError
+from jose import jwk
+from jose import jwt
+
+from chalice_cognito_auth.decoder import KeyFetcher
+from chalice_cognito_auth.userpool import CognitoLifecycle
+from chalice_cognito_auth.utils import RateLimiter
+
+
+DEFAULT_CONFIRMATION_CODE = '123456'
+DEFAULT_TOKEN_TTL = 3600
+
+
+def generate_private_key():
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    ).decode('utf-8')
+
+
+class FakeCognito:
+    """FakeCognito
+
+    An in-process stand in for the ``cognito-idp`` client. It implements the
+    calls made by ``CognitoLifecycle`` and issues RS256 tokens signed with a
+    local key, whose public half is served by ``urlopen`` in the same format
+    as the pool's ``jwks.json``. Every call can be slowed down by ``latency``
+    seconds and throttled to ``max_rps`` calls per second to reproduce
+    production behavior offline.
+    """
+    def __init__(self, app_client_id='local_client_id',
+                 user_pool_id='local_pool_id', region='local-region-1',
+                 private_key=None, kid='local', token_ttl=DEFAULT_TOKEN_TTL,
+                 confirmation_code=DEFAULT_CONFIRMATION_CODE, latency=0,
+                 max_rps=None, now=None, sleep=None):
+        self.app_client_id = app_client_id
+        self.user_pool_id = user_pool_id
+        self.region = region
+        if private_key is None:
+            private_key = generate_private_key()
+        self._signing_key = jwk.construct(private_key, 'RS256')
+        self._kid = kid
+        self._token_ttl = token_ttl
+        self._confirmation_code = confirmation_code
+        self._latency = latency
+        self._limiter = None
+        if max_rps is not None:
+            self._limiter = RateLimiter(max_rps)
+        if now is None:
+            now = time.time
+        self._now = now
+        if sleep is None:
+            sleep = time.sleep
+        self._sleep = sleep
+        self._users = {}
+        self._sessions = {}
+        self._refresh_tokens = {}
+        self._lock = threading.Lock()
+        self._jwks = None
+
+    @property
+    def issuer(self):
+        return 'https://cognito-idp.%s.amazonaws.com/%s' % (
+            self.region, self.user_pool_id)
+
+    @property
+    def keys_url(self):
+        return self.issuer + '/.well-known/jwks.json'
+
+    def create_key_fetcher(self) -> KeyFetcher:
+        return KeyFetcher(self.region, self.user_pool_id, urlopen=self.urlopen)
+
+    def create_lifecycle(self) -> CognitoLifecycle:
+        return CognitoLifecycle(self.app_client_id, self.user_pool_id, self)
+
+    def jwks(self):
+        if self._jwks is None:
+            public_key = self._signing_key.public_key().to_dict()
+            public_key['kid'] = self._kid
+            public_key['use'] = 'sig'
+            self._jwks = {'keys': [public_key]}
+        return self._jwks
+
+    def urlopen(self, url):
+        self._simulate_call('GetJwks')
+        if url != self.keys_url:
+            raise ValueError('Unknown url %s' % url)
+        return io.BytesIO(json.dumps(self.jwks()).encode('utf-8'))
+
+    def add_user(self, username, password, attributes=None, confirmed=True,
+                 temporary_password=False, groups=None):
+        with self._lock:
+            self._users[username] = {
+                'sub': str(uuid.uuid4()),
+                'password': password,
+                'attributes': dict(attributes or {}),
+                'confirmed': confirmed,
+                'temporary_password': temporary_password,
+                'groups': list(groups or []),
+            }
+
+    def get_user(self, username):
+        return self._users.get(username)
+
+    def create_tokens(self, username, token_ttl=None):
+        if token_ttl is None:
+            token_ttl = self._token_ttl
+        user = self._users[username]
+        now = int(self._now())
+        origin_jti = str(uuid.uuid4())
+        common = {
+            'sub': user['sub'],
+            'iss': self.issuer,
+            'iat': now,
+            'auth_time': now,
+            'exp': now + token_ttl,
+            'origin_jti': origin_jti,
+        }
+        if user['groups']:
+            common['cognito:groups'] = user['groups']
+        id_claims = dict(user['attributes'])
+        id_claims.update(common)
+        id_claims.update({
+            'aud': self.app_client_id,
+            'token_use': 'id',
+            'cognito:username': username,
+            'jti': str(uuid.uuid4()),
+        })
+        access_claims = dict(common)
+        access_claims.update({
+            'client_id': self.app_client_id,
+            'token_use': 'access',
+            'scope': 'aws.cognito.signin.user.admin',
+            'username': username,
+            'jti': str(uuid.uuid4()),
+        })
+        return {
+            'IdToken': self._sign(id_claims),
+            'AccessToken': self._sign(access_claims),
+            'ExpiresIn': token_ttl,
+            'TokenType': 'Bearer',
+        }
+
+    def _sign(self, claims):
+        return jwt.encode(
+            claims, self._signing_key, algorithm='RS256',
+            headers={'kid': self._kid},
+        )
+
+    def _simulate_call(self, operation):
+        latency = self._latency
+        if callable(latency):
+            latency = latency()
+        if latency:
+            self._sleep(latency)
+        if self._limiter is not None and not self._limiter.try_acquire():
+            raise _client_error(
+                operation, 'TooManyRequestsException', 'Rate exceeded')
+
+    def _check_client_id(self, operation, client_id):
+        if client_id != self.app_client_id:
+            raise _client_error(
+                operation, 'ResourceNotFoundException',
+                'User pool client %s does not exist.' % client_id,
+            )
+
+    def sign_up(self, Username, Password, UserAttributes, ClientId):
+        self._simulate_call('SignUp')
+        self._check_client_id('SignUp', ClientId)
+        with self._lock:
+            if Username in self._users:
+                raise _client_error(
+                    'SignUp', 'UsernameExistsException',
+                    'User already exists',
+                )
+            sub = str(uuid.uuid4())
+            self._users[Username] = {
+                'sub': sub,
+                'password': Password,
+                'attributes': {
+                    attribute['Name']: attribute['Value']
+                    for attribute in UserAttributes
+                },
+                'confirmed': False,
+                'temporary_password': False,
+                'groups': [],
+            }
+        return {
+            'UserConfirmed': False,
+            'UserSub': sub,
+        }
+
+    def confirm_sign_up(self, ConfirmationCode, Username, ClientId):
+        self._simulate_call('ConfirmSignUp')
+        self._check_client_id('ConfirmSignUp', ClientId)
+        user = self._find_user('ConfirmSignUp', Username)
+        if ConfirmationCode != self._confirmation_code:
+            raise _client_error(
+                'ConfirmSignUp', 'CodeMismatchException',
+                'Invalid verification code provided, please try again.',
+            )
+        user['confirmed'] = True
+        return {}
+
+    def initiate_auth(self, AuthFlow, AuthParameters, ClientId):
+        self._simulate_call('InitiateAuth')
+        self._check_client_id('InitiateAuth', ClientId)
+        if AuthFlow == 'USER_PASSWORD_AUTH':
+            return self._password_auth(AuthParameters)
+        if AuthFlow == 'REFRESH_TOKEN_AUTH':
+            return self._refresh_auth(AuthParameters)
+        raise _client_error(
+            'InitiateAuth', 'InvalidParameterException',
+            'Unsupported auth flow %s' % AuthFlow,
+        )
+
+    def _password_auth(self, params):
+        username = params['USERNAME']
+        user = self._find_user('InitiateAuth', username)
+        if user['password'] != params['PASSWORD']:
+            raise _client_error(
+                'InitiateAuth', 'NotAuthorizedException',
+                'Incorrect username or password.',
+            )
+        if not user['confirmed']:
+            raise _client_error(
+                'InitiateAuth', 'UserNotConfirmedException',
+                'User is not confirmed.',
+            )
+        if user['temporary_password']:
+            session = str(uuid.uuid4())
+            with self._lock:
+                self._sessions[session] = username
+            return {
+                'ChallengeName': 'NEW_PASSWORD_REQUIRED',
+                'Session': session,
+                'ChallengeParameters': {
+                    'USER_ID_FOR_SRP': username,
+                    'requiredAttributes': '[]',
+                    'userAttributes': json.dumps(user['attributes']),
+                },
+            }
+        return {'AuthenticationResult': self._issue_tokens(username)}
+
+    def _refresh_auth(self, params):
+        username = self._refresh_tokens.get(params['REFRESH_TOKEN'])
+        if username is None:
+            raise _client_error(
+                'InitiateAuth', 'NotAuthorizedException',
+                'Invalid Refresh Token',
+            )
+        return {'AuthenticationResult': self.create_tokens(username)}
+
+    def _issue_tokens(self, username):
+        tokens = self.create_tokens(username)
+        refresh_token = str(uuid.uuid4())
+        with self._lock:
+            self._refresh_tokens[refresh_token] = username
+        tokens['RefreshToken'] = refresh_token
+        return tokens
+
+    def respond_to_auth_challenge(self, ChallengeName, Session,
+                                  ChallengeResponses, ClientId):
+        self._simulate_call('RespondToAuthChallenge')
+        self._check_client_id('RespondToAuthChallenge', ClientId)
+        with self._lock:
+            username = self._sessions.pop(Session, None)
+        if username is None or ChallengeName != 'NEW_PASSWORD_REQUIRED':
+            raise _client_error(
+                'RespondToAuthChallenge', 'NotAuthorizedException',
+                'Invalid session for the user.',
+            )
+        user = self._find_user('RespondToAuthChallenge', username)
+        user['password'] = ChallengeResponses['NEW_PASSWORD']
+        user['temporary_password'] = False
+        return {'AuthenticationResult': self._issue_tokens(username)}
+
+    def _find_user(self, operation, username):
+        user = self._users.get(username)
+        if user is None:
+            raise _client_error(
+                operation, 'UserNotFoundException', 'User does not exist.')
+        return user
+
+
+def _client_error(operation, code, message):
+    return ClientError(
+        {'Error': {'Code': code, 'Message': message}}, operation)
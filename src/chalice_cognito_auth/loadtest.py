@@ -0,0 +1,278 @@
+"""Load test the user pool blueprint against a local fake Cognito.
+
+Usage::
+
+    python -m chalice_cognito_auth.loadtest --workers 8 --requests 2000
+
+Each worker drives its own Chalice app with the user pool blueprint mounted,
+the same way each Lambda container serves one request at a time, while all
+workers share one ``FakeCognito`` so its latency and throttling apply to the
+combined traffic. Workers are threads, so CPU bound work such as signature
+verification is serialized by the GIL. The report is written as JSON.
+"""
+import sys
+import json
+import base64
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from chalice import Chalice
+
+from chalice_cognito_auth.authorizer import UserPoolAuthorizer
+from chalice_cognito_auth.blueprint import BlueprintFactory
+from chalice_cognito_auth.cache import InMemoryCache
+from chalice_cognito_auth.decoder import TokenDecoder
+from chalice_cognito_auth.fakecognito import FakeCognito
+from chalice_cognito_auth.userpool import UserPoolHandler
+
+
+DEFAULT_MIX = {
+    'login': 1,
+    'refresh': 1,
+    'authorized_valid': 6,
+    'authorized_expired': 1,
+    'authorized_forged': 1,
+}
+EXPECTED_STATUS = {
+    'login': 200,
+    'refresh': 200,
+    'authorized_valid': 200,
+    'authorized_expired': 403,
+    'authorized_forged': 403,
+}
+METHOD_ARN = (
+    'arn:aws:execute-api:local-region-1:123456789012:api-id/api/GET/whoami'
+)
+PASSWORD = 'Password1!'
+_handler_names = iter(range(sys.maxsize))
+
+
+def create_app(cognito, name=None):
+    if name is None:
+        name = 'LoadTestAuth%s' % next(_handler_names)
+    app = Chalice(app_name='loadtest')
+    decoder = TokenDecoder(
+        cognito.create_key_fetcher(), cognito.app_client_id,
+        cache=InMemoryCache(),
+    )
+    authorizer = UserPoolAuthorizer(decoder)
+    blueprint, auth_wrapper = BlueprintFactory().create_blueprint(
+        name, authorizer, cognito.create_lifecycle())
+    handler = UserPoolHandler(authorizer, blueprint, auth_wrapper)
+    app.register_blueprint(handler.blueprint)
+
+    @app.route('/whoami', authorizer=handler.auth)
+    def whoami():
+        return {'username': handler.current_user}
+
+    return app, handler
+
+
+def create_event(path, method='POST', body=None, authorizer=None):
+    request_context = {
+        'httpMethod': method,
+        'resourcePath': path,
+    }
+    if authorizer is not None:
+        request_context['authorizer'] = authorizer
+    return {
+        'requestContext': request_context,
+        'headers': {'Content-Type': 'application/json'},
+        'pathParameters': {},
+        'multiValueQueryStringParameters': None,
+        'body': json.dumps(body) if body is not None else None,
+        'stageVariables': {},
+    }
+
+
+def forge_token(token):
+    header, _, signature = token.split('.')
+    payload = json.dumps({'cognito:username': 'admin', 'exp': 2 ** 40})
+    payload = base64.urlsafe_b64encode(payload.encode('utf-8'))
+    payload = payload.rstrip(b'=').decode('utf-8')
+    return '.'.join([header, payload, signature])
+
+
+class Worker:
+    def __init__(self, cognito, username):
+        self._app, self._handler = create_app(cognito)
+        self._username = username
+        cognito.add_user(username, PASSWORD)
+        tokens = cognito.create_lifecycle().login(username, PASSWORD)
+        self._refresh_token = tokens['refresh_token']
+        self._tokens = {
+            'authorized_valid': tokens['id_token'],
+            'authorized_expired': cognito.create_tokens(
+                username, token_ttl=-1)['IdToken'],
+            'authorized_forged': forge_token(tokens['id_token']),
+        }
+
+    def run(self, operation):
+        if operation == 'login':
+            return self._call(create_event('/login', body={
+                'username': self._username,
+                'password': PASSWORD,
+            }))
+        if operation == 'refresh':
+            return self._call(create_event('/refresh', body={
+                'refresh_token': self._refresh_token,
+            }))
+        return self._authorized_call(self._tokens[operation])
+
+    def _call(self, event):
+        return self._app(event, context=None)['statusCode']
+
+    def _authorized_call(self, token):
+        result = self._handler.auth({
+            'type': 'TOKEN',
+            'authorizationToken': token,
+            'methodArn': METHOD_ARN,
+        }, None)
+        statement = result['policyDocument']['Statement'][0]
+        if not statement['Resource']:
+            return 403
+        return self._call(create_event(
+            '/whoami', method='GET',
+            authorizer={'principalId': result['principalId']},
+        ))
+
+
+def run_load_test(cognito=None, workers=4, requests=1000, mix=None,
+                  seed=None):
+    if cognito is None:
+        cognito = FakeCognito()
+    if mix is None:
+        mix = DEFAULT_MIX
+    rng = random.Random(seed)
+    operations, weights = zip(*sorted(mix.items()))
+    plan = rng.choices(operations, weights=weights, k=requests)
+    pool = [
+        Worker(cognito, 'loadtest-user-%s' % i)
+        for i in range(workers)
+    ]
+    samples = []
+    lock = threading.Lock()
+    position = iter(range(requests))
+
+    def drive(worker):
+        results = []
+        for i in position:
+            operation = plan[i]
+            start = time.perf_counter()
+            try:
+                status = worker.run(operation)
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - start
+            results.append((operation, elapsed, status))
+        with lock:
+            samples.extend(results)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(drive, pool))
+    duration = time.perf_counter() - start
+    return build_report(samples, duration, {
+        'workers': workers,
+        'requests': requests,
+        'mix': dict(mix),
+        'seed': seed,
+    })
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    index = max(int(round(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def summarize(samples, duration):
+    latencies = sorted(elapsed * 1000 for _, elapsed, _ in samples)
+    errors = sum(
+        1 for operation, _, status in samples
+        if status != EXPECTED_STATUS[operation]
+    )
+    status_codes = {}
+    for _, _, status in samples:
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+    count = len(samples)
+    return {
+        'count': count,
+        'errors': errors,
+        'error_rate': errors / count if count else 0.0,
+        'throughput': count / duration if duration else 0.0,
+        'status_codes': status_codes,
+        'latency_ms': {
+            'mean': sum(latencies) / count if count else None,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+        },
+    }
+
+
+def build_report(samples, duration, config):
+    by_operation = {}
+    for sample in samples:
+        by_operation.setdefault(sample[0], []).append(sample)
+    return {
+        'config': config,
+        'duration': duration,
+        'overall': summarize(samples, duration),
+        'operations': {
+            operation: summarize(operation_samples, duration)
+            for operation, operation_samples in sorted(by_operation.items())
+        },
+    }
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        operation, _, weight = part.partition('=')
+        if operation not in EXPECTED_STATUS:
+            raise argparse.ArgumentTypeError(
+                'Unknown operation %s' % operation)
+        mix[operation] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument(
+        '--mix', type=parse_mix, default=None,
+        help='Comma separated operation=weight pairs, for example '
+             'login=1,authorized_valid=9')
+    parser.add_argument(
+        '--latency', type=float, default=0,
+        help='Seconds added to every fake Cognito call.')
+    parser.add_argument(
+        '--max-rps', type=float, default=None,
+        help='Throttle fake Cognito calls above this rate.')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument(
+        '--output', default='-', help='File to write the JSON report to.')
+    args = parser.parse_args(argv)
+    cognito = FakeCognito(latency=args.latency, max_rps=args.max_rps)
+    report = run_load_test(
+        cognito, workers=args.workers, requests=args.requests,
+        mix=args.mix, seed=args.seed,
+    )
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
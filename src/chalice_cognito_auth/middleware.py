@@ -0,0 +1,107 @@
+import re
+from fnmatch import fnmatchcase
+
+from chalice import AuthRoute
+from chalice import Response
+
+from chalice_cognito_auth.exceptions import InvalidToken
+
+
+_PROTECTED_ATTR = '_local_auth_middleware'
+_URI_PARAM = re.compile(r'\{([^}+]+)\+?\}')
+
+
+class LocalAuthMiddleware:
+    """LocalAuthMiddleware
+
+    Authorizes requests inside the app Lambda instead of through the API
+    Gateway custom authorizer. Only views marked with ``protect`` are checked,
+    every other request is passed straight through.
+    """
+    def __init__(self, authorizer):
+        self._authorizer = authorizer
+        self._has_views = False
+        self._blueprint = None
+
+    def register(self, blueprint):
+        self._blueprint = blueprint
+        blueprint.register_middleware(self, 'http')
+
+    def protect(self, view):
+        # An attribute instead of a registry of function objects, so views
+        # are still found when another decorator wraps them afterwards.
+        # functools.wraps copies it onto the wrapper.
+        setattr(view, _PROTECTED_ATTR, self)
+        self._has_views = True
+        return view
+
+    def __call__(self, event, get_response):
+        if not self._is_protected(event):
+            return get_response(event)
+        token = event.headers.get('authorization')
+        if not token:
+            return _unauthorized()
+        try:
+            routes, principal_id, claims = self._authorizer.authorize(token)
+        except InvalidToken:
+            # The authorizer answers invalid tokens with an empty policy,
+            # which API Gateway turns into a 403 rather than a 401.
+            return _forbidden()
+        path = get_request_path(event.path, event.uri_params)
+        if not is_route_allowed(routes, path, event.method):
+            return _forbidden()
+        event.context['authorizer'] = {
+            'principalId': principal_id,
+            # A plain dict, like API Gateway provides, so views can return
+            # the claims in a JSON response.
+            'claims': dict(claims),
+        }
+        return get_response(event)
+
+    def _is_protected(self, event):
+        if not self._has_views or event is None:
+            return False
+        routes = self._blueprint.current_app.routes
+        entry = routes.get(event.path, {}).get(event.method)
+        if entry is None:
+            return False
+        view = entry.view_function
+        while view is not None:
+            if getattr(view, _PROTECTED_ATTR, None) is self:
+                return True
+            view = getattr(view, '__wrapped__', None)
+        return False
+
+
+def get_request_path(template, uri_params):
+    # Chalice exposes the route template, API Gateway matches policies
+    # against the path that was actually requested.
+    if not uri_params:
+        return template
+    return _URI_PARAM.sub(lambda m: uri_params[m.group(1)], template)
+
+
+def is_route_allowed(routes, path, method):
+    for route in routes:
+        if isinstance(route, AuthRoute):
+            route_path, methods = route.path, route.methods
+        else:
+            route_path, methods = route, ['*']
+        if route_path != '*' and not fnmatchcase(path, route_path):
+            continue
+        if '*' in methods or method in methods:
+            return True
+    return False
+
+
+def _unauthorized():
+    # Mirror the bodies API Gateway sends back when the token is missing or
+    # when the policy returned by the authorizer does not cover the route.
+    return Response(body={'message': 'Unauthorized'}, status_code=401)
+
+
+def _forbidden():
+    return Response(
+        body={'Message': 'User is not authorized to access this resource'},
+        status_code=403,
+    )
@@ -0,0 +1,166 @@
+import json
+import random
+import cProfile
+import logging
+import pstats
+import functools
+import threading
+import tracemalloc
+
+from chalice_cognito_auth.constants import PROFILE_SAMPLE_RATE_ENV_VAR
+from chalice_cognito_auth.constants import PROFILE_TOP_N_ENV_VAR
+from chalice_cognito_auth.constants import PROFILE_REPORT_EVERY_ENV_VAR
+from chalice_cognito_auth.constants import PROFILE_TRACEMALLOC_ENV_VAR
+from chalice_cognito_auth.utils import env_var
+
+
+LOG = logging.getLogger(__name__)
+DEFAULT_TOP_N = 10
+DEFAULT_REPORT_EVERY = 10
+
+
+class SamplingProfiler:
+    """SamplingProfiler
+
+    Profiles a random ``sample_rate`` fraction of calls to decorated
+    functions with cProfile, and optionally tracemalloc. Results are
+    aggregated per function and every ``report_every`` samples a summary of
+    the ``top_n`` entries is logged as a single JSON line. With a sample rate
+    of zero functions are returned undecorated.
+    """
+    def __init__(self, sample_rate=0.0, top_n=DEFAULT_TOP_N,
+                 report_every=DEFAULT_REPORT_EVERY, trace_memory=False,
+                 logger=None, rand=None):
+        self._sample_rate = sample_rate
+        self._top_n = top_n
+        self._report_every = report_every
+        self._trace_memory = trace_memory
+        if logger is None:
+            logger = LOG
+        self._logger = logger
+        if rand is None:
+            rand = random.random
+        self._random = rand
+        self._lock = threading.Lock()
+        self._active = False
+        self._samples = {}
+
+    @classmethod
+    def from_env(cls) -> 'SamplingProfiler':
+        return cls(
+            sample_rate=float(env_var(PROFILE_SAMPLE_RATE_ENV_VAR, '0')),
+            top_n=int(env_var(PROFILE_TOP_N_ENV_VAR, str(DEFAULT_TOP_N))),
+            report_every=int(env_var(
+                PROFILE_REPORT_EVERY_ENV_VAR, str(DEFAULT_REPORT_EVERY))),
+            trace_memory=env_var(PROFILE_TRACEMALLOC_ENV_VAR, '') == '1',
+        )
+
+    @property
+    def enabled(self):
+        return self._sample_rate > 0
+
+    def profile(self, fn):
+        if not self.enabled:
+            return fn
+        name = fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            if self._active or self._random() >= self._sample_rate:
+                return fn(*args, **kwargs)
+            return self._run_profiled(name, fn, args, kwargs)
+        return wrapped
+
+    def _run_profiled(self, name, fn, args, kwargs):
+        # Only one cProfile profiler can be active at a time, so calls made
+        # while another sample is running are not profiled.
+        with self._lock:
+            if self._active:
+                return fn(*args, **kwargs)
+            self._active = True
+        # Tracing slows down every allocation, so it is only left running
+        # if something other than this profiler started it.
+        started_tracing = self._trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            profiler = cProfile.Profile()
+            before = self._take_snapshot()
+            profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                self._record(name, profiler, before)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self._active = False
+
+    def _take_snapshot(self):
+        if not self._trace_memory:
+            return None
+        return tracemalloc.take_snapshot()
+
+    def _record(self, name, profiler, before):
+        sample = self._samples.get(name)
+        if sample is None:
+            sample = self._samples[name] = _Samples()
+        sample.add(profiler, before, self._take_snapshot())
+        if sample.count >= self._report_every:
+            self._logger.info(json.dumps(sample.summary(name, self._top_n)))
+            del self._samples[name]
+
+
+class _Samples:
+    def __init__(self):
+        self.count = 0
+        self._stats = None
+        self._memory = {}
+
+    def add(self, profiler, before, after):
+        self.count += 1
+        if self._stats is None:
+            self._stats = pstats.Stats(profiler)
+        else:
+            self._stats.add(profiler)
+        if before is not None and after is not None:
+            for diff in after.compare_to(before, 'lineno'):
+                frame = diff.traceback[0]
+                location = '%s:%s' % (frame.filename, frame.lineno)
+                self._memory[location] = (
+                    self._memory.get(location, 0) + diff.size_diff)
+
+    def summary(self, name, top_n):
+        entries = sorted(
+            self._stats.stats.items(), key=lambda item: item[1][3],
+            reverse=True,
+        )[:top_n]
+        summary = {
+            'profile': name,
+            'samples': self.count,
+            'top': [
+                {
+                    'function': '%s:%s(%s)' % key,
+                    'calls': calls,
+                    'tottime': tottime,
+                    'cumtime': cumtime,
+                }
+                for key, (_, calls, tottime, cumtime, _) in entries
+            ],
+        }
+        if self._memory:
+            memory = sorted(
+                self._memory.items(), key=lambda item: abs(item[1]),
+                reverse=True,
+            )[:top_n]
+            summary['memory'] = [
+                {'location': location, 'size_diff': size}
+                for location, size in memory
+            ]
+        return summary
+
+
+profiler = SamplingProfiler.from_env()
+if profiler.enabled:
+    LOG.setLevel(logging.INFO)
@@ -0,0 +1,164 @@
+import math
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from chalice_cognito_auth.exceptions import RevocationListUnavailableError
+
+
+LOG = logging.getLogger(__name__)
+DEFAULT_SYNC_INTERVAL = 60
+DEFAULT_RETRY_INTERVAL = 1
+DEFAULT_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self._size = max(
+            int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self._hash_count = max(
+            int(round(self._size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.sha256(value.encode('utf-8')).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:16], 'big') | 1
+        for i in range(self._hash_count):
+            yield (first + i * second) % self._size
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class RevocationStore:
+    def revoke(self, jti, expires):
+        raise NotImplementedError('revoke')
+
+    def get_revoked(self):
+        raise NotImplementedError('get_revoked')
+
+    def is_revoked(self, jti):
+        raise NotImplementedError('is_revoked')
+
+
+class SQLiteRevocationStore(RevocationStore):
+    """SQLiteRevocationStore
+
+    Keeps revoked token ids in a SQLite database. Intended as a local stand
+    in for a shared store and for tests.
+    """
+    def __init__(self, path=':memory:', now=None):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        if now is None:
+            now = time.time
+        self._now = now
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS revoked '
+                '(jti TEXT PRIMARY KEY, expires REAL NOT NULL)'
+            )
+
+    def revoke(self, jti, expires):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO revoked (jti, expires) VALUES (?, ?)',
+                (jti, expires),
+            )
+
+    def get_revoked(self):
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT jti FROM revoked WHERE expires > ?', (self._now(),),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def is_revoked(self, jti):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT 1 FROM revoked WHERE jti = ? AND expires > ?',
+                (jti, self._now()),
+            ).fetchone()
+        return row is not None
+
+
+class RevocationChecker:
+    """RevocationChecker
+
+    Checks the ``origin_jti`` and ``jti`` claims of a token against a Bloom
+    filter of revoked ids that is rebuilt from the store every
+    ``sync_interval`` seconds. The store is only queried when the filter
+    reports a possible match. Tokens revoked after the last sync are not
+    detected until the next one. If a sync fails the previous filter keeps
+    being used and the sync is retried with exponential backoff, starting at
+    ``retry_interval`` seconds. Checks made while another thread syncs use
+    the previous filter and only fail while no sync has ever succeeded.
+    """
+    def __init__(self, store, sync_interval=DEFAULT_SYNC_INTERVAL,
+                 error_rate=DEFAULT_ERROR_RATE, now=None,
+                 retry_interval=DEFAULT_RETRY_INTERVAL):
+        self._store = store
+        self._sync_interval = sync_interval
+        self._retry_interval = retry_interval
+        self._failures = 0
+        self._error_rate = error_rate
+        if now is None:
+            now = time.time
+        self._now = now
+        self._filter = None
+        self._next_sync = 0
+        self._lock = threading.Lock()
+
+    def sync(self):
+        revoked = self._store.get_revoked()
+        bloom_filter = BloomFilter(len(revoked), self._error_rate)
+        for jti in revoked:
+            bloom_filter.add(jti)
+        self._filter = bloom_filter
+        self._next_sync = self._now() + self._sync_interval
+
+    def _get_filter(self):
+        if self._now() >= self._next_sync:
+            # One thread syncs while the others keep checking against the
+            # current filter. Only without a filter do they wait for it.
+            if self._lock.acquire(blocking=self._filter is None):
+                try:
+                    if self._now() >= self._next_sync:
+                        self._try_sync()
+                finally:
+                    self._lock.release()
+        if self._filter is None:
+            raise RevocationListUnavailableError()
+        return self._filter
+
+    def _try_sync(self):
+        try:
+            self.sync()
+        except Exception:
+            LOG.warning('Failed to sync revoked token ids', exc_info=True)
+            delay = self._retry_interval * 2 ** self._failures
+            self._failures += 1
+            self._next_sync = self._now() + min(delay, self._sync_interval)
+        else:
+            self._failures = 0
+
+    def is_revoked(self, claims):
+        bloom_filter = self._get_filter()
+        for name in ('origin_jti', 'jti'):
+            jti = claims.get(name)
+            if jti is None or jti not in bloom_filter:
+                continue
+            if self._store.is_revoked(jti):
+                return True
+        return False
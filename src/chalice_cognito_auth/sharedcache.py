@@ -0,0 +1,133 @@
+import os
+import json
+import mmap
+import time
+import fcntl
+import struct
+import hashlib
+import threading
+
+
+DEFAULT_SLOTS = 1024
+DEFAULT_SLOT_SIZE = 4096
+_HEADER = struct.Struct('<dI32s')
+
+
+class SharedMemoryCache:
+    """SharedMemoryCache
+
+    A cache backed by a memory mapped file so every process that opens the
+    same ``path`` shares its entries, for example the workers of a pre-fork
+    server. The file is split into fixed size slots and each key maps to
+    exactly one slot, so a colliding key simply replaces the previous entry.
+    Slots are guarded by ``fcntl`` record locks, shared for readers and
+    exclusive for writers. Values are stored as JSON, mappings come back as
+    plain dicts, and values that do not fit in a slot are not cached.
+    """
+    def __init__(self, path, slots=DEFAULT_SLOTS,
+                 slot_size=DEFAULT_SLOT_SIZE, now=None):
+        self._slots = slots
+        self._slot_size = slot_size
+        self._max_value_size = slot_size - _HEADER.size
+        if now is None:
+            now = time.time
+        self._now = now
+        self._lock = threading.Lock()
+        size = slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def _key_id(self, key):
+        if not isinstance(key, bytes):
+            key = str(key).encode('utf-8')
+        return hashlib.sha256(key).digest()
+
+    def _offset(self, key_id):
+        index = int.from_bytes(key_id[:8], 'big') % self._slots
+        return index * self._slot_size
+
+    def _locked(self, offset, exclusive):
+        return _SlotLock(
+            self._fd, self._lock, offset, self._slot_size, exclusive)
+
+    def get(self, key):
+        key_id = self._key_id(key)
+        offset = self._offset(key_id)
+        with self._locked(offset, exclusive=False):
+            expires, length, stored_id = _HEADER.unpack_from(
+                self._map, offset)
+            if stored_id != key_id or length == 0:
+                return None
+            if self._now() >= expires:
+                return None
+            start = offset + _HEADER.size
+            data = self._map[start:start + length]
+        return json.loads(data.decode('utf-8'))
+
+    def set(self, key, value, expires):
+        data = json.dumps(value, default=dict).encode('utf-8')
+        if len(data) > self._max_value_size:
+            return
+        key_id = self._key_id(key)
+        offset = self._offset(key_id)
+        with self._locked(offset, exclusive=True):
+            start = offset + _HEADER.size
+            self._map[start:start + len(data)] = data
+            _HEADER.pack_into(self._map, offset, expires, len(data), key_id)
+
+    def delete(self, key):
+        key_id = self._key_id(key)
+        offset = self._offset(key_id)
+        with self._locked(offset, exclusive=True):
+            stored_id = _HEADER.unpack_from(self._map, offset)[2]
+            if stored_id == key_id:
+                _HEADER.pack_into(self._map, offset, 0, 0, bytes(32))
+
+    def clear(self):
+        for index in range(self._slots):
+            offset = index * self._slot_size
+            with self._locked(offset, exclusive=True):
+                _HEADER.pack_into(self._map, offset, 0, 0, bytes(32))
+
+    def __len__(self):
+        now = self._now()
+        count = 0
+        for index in range(self._slots):
+            offset = index * self._slot_size
+            with self._locked(offset, exclusive=False):
+                expires, length, _ = _HEADER.unpack_from(self._map, offset)
+            if length and now < expires:
+                count += 1
+        return count
+
+
+class _SlotLock:
+    def __init__(self, fd, thread_lock, offset, length, exclusive):
+        self._fd = fd
+        self._thread_lock = thread_lock
+        self._offset = offset
+        self._length = length
+        self._mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+
+    def __enter__(self):
+        # Record locks are held per process, so threads of the same process
+        # are serialized separately.
+        self._thread_lock.acquire()
+        try:
+            fcntl.lockf(self._fd, self._mode, self._length, self._offset)
+        except Exception:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self._length, self._offset)
+        finally:
+            self._thread_lock.release()
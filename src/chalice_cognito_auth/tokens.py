@@ -0,0 +1,196 @@
+import time
+import random
+import logging
+import threading
+
+from botocore.exceptions import ClientError
+
+from chalice_cognito_auth.claims import Claims
+
+
+LOG = logging.getLogger(__name__)
+DEFAULT_REFRESH_MARGIN = 300
+DEFAULT_JITTER = 60
+DEFAULT_RETRY_INTERVAL = 5
+
+
+class Credential:
+    def fetch(self, lifecycle):
+        raise NotImplementedError('fetch')
+
+
+class RefreshTokenCredential(Credential):
+    def __init__(self, refresh_token):
+        self._refresh_token = refresh_token
+
+    def fetch(self, lifecycle):
+        return lifecycle.refresh(self._refresh_token)
+
+
+class PasswordCredential(Credential):
+    """PasswordCredential
+
+    Logs in with a username and password the first time, then uses the
+    returned refresh token until Cognito rejects it.
+    """
+    def __init__(self, username, password):
+        self._username = username
+        self._password = password
+        self._refresh_token = None
+
+    def fetch(self, lifecycle):
+        if self._refresh_token is not None:
+            try:
+                return lifecycle.refresh(self._refresh_token)
+            except ClientError:
+                self._refresh_token = None
+        tokens = lifecycle.login(self._username, self._password)
+        self._refresh_token = tokens.get('refresh_token')
+        return tokens
+
+
+class TokenProvider:
+    """TokenProvider
+
+    Caches tokens per credential and refreshes them in the background
+    between ``refresh_margin`` and ``refresh_margin + jitter`` seconds before
+    they expire. At most one refresh per credential is in flight, callers
+    only wait for Cognito when there is no unexpired token to hand out.
+    Failed background refreshes are retried with exponential backoff,
+    starting at ``retry_interval`` seconds.
+    """
+    def __init__(self, lifecycle, token_use='access',
+                 refresh_margin=DEFAULT_REFRESH_MARGIN, jitter=DEFAULT_JITTER,
+                 now=None, rand=None, timer_factory=None,
+                 retry_interval=DEFAULT_RETRY_INTERVAL):
+        self._lifecycle = lifecycle
+        self._token_key = '%s_token' % token_use
+        self._refresh_margin = refresh_margin
+        self._jitter = jitter
+        self._retry_interval = retry_interval
+        if now is None:
+            now = time.time
+        self._now = now
+        if rand is None:
+            rand = random.random
+        self._random = rand
+        if timer_factory is None:
+            timer_factory = threading.Timer
+        self._timer_factory = timer_factory
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, credential):
+        entry = self._get_entry(credential)
+        token = entry.token
+        now = self._now()
+        if token is not None and now < entry.expires_at:
+            if now >= entry.refresh_at and self._begin_refresh(entry, now):
+                threading.Thread(
+                    target=self._refresh_in_background,
+                    args=(credential, entry),
+                    daemon=True,
+                ).start()
+            return token
+        return self._fetch(credential, entry)
+
+    def close(self):
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.timer is not None:
+                    entry.timer.cancel()
+
+    def _get_entry(self, credential):
+        entry = self._entries.get(credential)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.setdefault(credential, _Entry())
+        return entry
+
+    def _fetch(self, credential, entry):
+        with entry.condition:
+            while entry.refreshing:
+                entry.condition.wait()
+            if entry.token is not None and self._now() < entry.expires_at:
+                return entry.token
+            entry.refreshing = True
+        return self._refresh(credential, entry)
+
+    def _begin_refresh(self, entry, now=None):
+        # Claims the entry for one refresh. With ``now`` the refresh is only
+        # claimed if it is still due, since another one may have finished
+        # and moved refresh_at forward in the meantime.
+        with entry.condition:
+            if entry.refreshing:
+                return False
+            if now is not None and now < entry.refresh_at:
+                return False
+            entry.refreshing = True
+            return True
+
+    def _refresh_when_scheduled(self, credential, entry):
+        if self._begin_refresh(entry):
+            self._refresh_in_background(credential, entry)
+
+    def _refresh_in_background(self, credential, entry):
+        try:
+            self._refresh(credential, entry, backoff=True)
+        except Exception:
+            LOG.warning('Background token refresh failed', exc_info=True)
+
+    def _refresh(self, credential, entry, backoff=False):
+        try:
+            token = credential.fetch(self._lifecycle)[self._token_key]
+            expires_at = Claims.from_token(token)['exp']
+        except Exception:
+            with entry.condition:
+                if backoff:
+                    # Moved forward before the entry is released, so no
+                    # caller can start another refresh right away.
+                    delay = self._retry_interval * 2 ** entry.failures
+                    entry.failures += 1
+                    entry.refresh_at = self._now() + min(
+                        delay, self._refresh_margin)
+                entry.refreshing = False
+                entry.condition.notify_all()
+            raise
+        refresh_at = (
+            expires_at - self._refresh_margin - self._random() * self._jitter
+        )
+        with entry.condition:
+            entry.token = token
+            entry.expires_at = expires_at
+            entry.refresh_at = refresh_at
+            entry.failures = 0
+            entry.refreshing = False
+            entry.condition.notify_all()
+        self._schedule(credential, entry, refresh_at)
+        return token
+
+    def _schedule(self, credential, entry, refresh_at):
+        if entry.timer is not None:
+            entry.timer.cancel()
+        timer = self._timer_factory(
+            max(refresh_at - self._now(), 0),
+            self._refresh_when_scheduled,
+            args=(credential, entry),
+        )
+        timer.daemon = True
+        timer.start()
+        entry.timer = timer
+
+
+class _Entry:
+    __slots__ = (
+        'token', 'expires_at', 'refresh_at', 'refreshing', 'failures',
+        'condition', 'timer',
+    )
+
+    def __init__(self):
+        self.token = None
+        self.expires_at = 0
+        self.refresh_at = 0
+        self.refreshing = False
+        self.failures = 0
+        self.condition = threading.Condition()
+        self.timer = None
@@ -1,16 +1,40 @@
-import boto3
+import json
+import datetime
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
+from botocore.exceptions import BotoCoreError
+from botocore.exceptions import ClientError
+from botocore.exceptions import ParamValidationError
+from chalice import BadRequestError
+from chalice import ChaliceViewError
+from chalice import ForbiddenError
+from chalice import UnauthorizedError
+
+from chalice_cognito_auth import coldstart
 from chalice_cognito_auth.blueprint import BlueprintFactory
+from chalice_cognito_auth.cache import InMemoryCache
+from chalice_cognito_auth.cache import token_digest
+from chalice_cognito_auth.claims import get_claim_sets
+from chalice_cognito_auth.clients import registry
 from chalice_cognito_auth.decoder import TokenDecoder
 from chalice_cognito_auth.decoder import KeyFetcher
 from chalice_cognito_auth.authorizer import UserPoolAuthorizer
+from chalice_cognito_auth.middleware import LocalAuthMiddleware
+from chalice_cognito_auth.profiling import profiler
 from chalice_cognito_auth.exceptions import ChallengeError
+from chalice_cognito_auth.exceptions import InvalidToken
 from chalice_cognito_auth.constants import CLIENT_ID_ENV_VAR
 from chalice_cognito_auth.constants import USER_POOL_ID_ENV_VAR
 from chalice_cognito_auth.constants import REGION_ENV_VAR
 from chalice_cognito_auth.constants import DEFAULT_USER_POOL_HANDLER_NAME
 from chalice_cognito_auth.constants import USER_POOL_HANDLER_NAME_ENV_VAR
+from chalice_cognito_auth.constants import DEFAULT_BULK_REGISTER_MAX_WORKERS
+from chalice_cognito_auth.constants import DEFAULT_BULK_REGISTER_RATE
+from chalice_cognito_auth.constants import LIST_USERS_PAGE_SIZE
 from chalice_cognito_auth.utils import env_var
+from chalice_cognito_auth.utils import map_client_error
+from chalice_cognito_auth.utils import RateLimiter
 
 
 class UserPoolHandlerFactory:
@@ -19,8 +43,12 @@ class UserPoolHandlerFactory:
             blueprint_factory = BlueprintFactory()
         self._blueprint_factory = blueprint_factory
 
+    @coldstart.timer.timed('create_user_pool_handler')
     def create_user_pool_handler(self, app_client_id=None, user_pool_id=None,
-                                 region=None, name=None, cors=False):
+                                 region=None, name=None, cors=False,
+                                 revocation_checker=None, cache=None,
+                                 bulk_register=None, export_users=None,
+                                 jwks=False):
         if app_client_id is None:
             app_client_id = env_var(CLIENT_ID_ENV_VAR, 'PLACEHOLDER')
         if user_pool_id is None:
@@ -29,26 +57,42 @@ class UserPoolHandlerFactory:
             region = env_var(REGION_ENV_VAR, 'PLACEHOLDER')
         if name is None:
             name = DEFAULT_USER_POOL_HANDLER_NAME
-        key_fetcher = KeyFetcher(region, user_pool_id)
-        decoder = TokenDecoder(key_fetcher, app_client_id)
+        if cache is None:
+            key_fetcher = KeyFetcher(region, user_pool_id)
+            cache = InMemoryCache()
+        else:
+            key_fetcher = KeyFetcher(region, user_pool_id, cache=cache)
+        decoder = TokenDecoder(
+            key_fetcher, app_client_id, cache=cache,
+            revocation_checker=revocation_checker,
+        )
         authorizer = UserPoolAuthorizer(decoder)
-        cognito = boto3.client('cognito-idp', region_name=region)
-        lifecycle = CognitoLifecycle(app_client_id, user_pool_id, cognito)
+        middleware = LocalAuthMiddleware(authorizer)
+        lifecycle = CognitoLifecycle(
+            app_client_id, user_pool_id, region=region)
         blueprint, auth_wrapper = self._blueprint_factory.create_blueprint(
-            name, authorizer, lifecycle, cors=cors)
-        handler = UserPoolHandler(authorizer, blueprint, auth_wrapper)
+            name, authorizer, lifecycle, cors=cors, middleware=middleware,
+            bulk_register=bulk_register, export_users=export_users,
+            key_fetcher=key_fetcher if jwks else None,
+        )
+        handler = UserPoolHandler(
+            authorizer, blueprint, auth_wrapper, middleware=middleware)
         return handler
 
 
 class UserPoolHandler:
-    def __init__(self, authorizer, blueprint, auth_wrapper):
+    def __init__(self, authorizer, blueprint, auth_wrapper, middleware=None):
         self._authorizer = authorizer
         self.blueprint = blueprint
         self._auth_wrapper = auth_wrapper
+        self._middleware = middleware
+        self._claim_sets = InMemoryCache()
 
     @classmethod
+    @coldstart.timer.timed('UserPoolHandler.from_env')
     def from_env(cls) -> 'UserPoolHandler':
         authorizer = UserPoolAuthorizer.from_env()
+        middleware = LocalAuthMiddleware(authorizer)
         blueprint, auth_wrapper = BlueprintFactory.from_env().create_blueprint(
             name=env_var(
                 USER_POOL_HANDLER_NAME_ENV_VAR,
@@ -56,17 +100,28 @@ class UserPoolHandler:
             ),
             authorizer=authorizer,
             lifecycle=CognitoLifecycle.from_env(),
+            middleware=middleware,
         )
         return cls(
             authorizer=authorizer,
             blueprint=blueprint,
             auth_wrapper=auth_wrapper,
+            middleware=middleware,
         )
 
     @property
     def auth(self):
         return self._auth_wrapper
 
+    @property
+    def local_auth(self):
+        return self._middleware.protect
+
+    @property
+    def current_claims(self):
+        request = self.blueprint.current_request
+        return request.context.get('authorizer', {}).get('claims')
+
     @property
     def current_user(self):
         request = self.blueprint.current_request
@@ -76,24 +131,77 @@ class UserPoolHandler:
     def pid(self):
         return self.current_user
 
+    def requires(self, groups=None, scopes=None):
+        """Restrict a view to tokens with the given groups and scopes.
+
+        The token must belong to at least one of ``groups`` and must have
+        been granted all of ``scopes``.
+        """
+        required_groups = frozenset(groups or ())
+        required_scopes = frozenset(scopes or ())
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapped(*args, **kwargs):
+                claim_sets = self._get_claim_sets()
+                if required_groups and \
+                        required_groups.isdisjoint(claim_sets.groups):
+                    raise ForbiddenError('Missing required group')
+                if not required_scopes <= claim_sets.scopes:
+                    raise ForbiddenError('Missing required scope')
+                return view(*args, **kwargs)
+            return wrapped
+        return decorator
+
+    def _get_claim_sets(self):
+        request = self.blueprint.current_request
+        token = request.headers.get('authorization')
+        if not token:
+            raise UnauthorizedError('Missing token')
+        # The token is checked on every request, so revoked tokens are
+        # rejected, only the parsed sets are cached.
+        try:
+            claims = self._authorizer.get_claims(token)
+        except InvalidToken:
+            raise UnauthorizedError('Invalid token')
+        key = token_digest(token)
+        claim_sets = self._claim_sets.get(key)
+        if claim_sets is None:
+            claim_sets = get_claim_sets(claims)
+            self._claim_sets.set(key, claim_sets, claims['exp'])
+        return claim_sets
+
 
 class CognitoLifecycle:
-    def __init__(self, app_client_id, user_pool_id, cognito):
+    def __init__(self, app_client_id, user_pool_id, cognito=None,
+                 region=None, client_registry=None):
         self._app_client_id = app_client_id
         self._user_pool_id = user_pool_id
         self._cognito = cognito
+        self._region = region
+        if client_registry is None:
+            client_registry = registry
+        self._client_registry = client_registry
 
     @classmethod
     def from_env(cls) -> 'CognitoLifecycle':
         return cls(
             app_client_id=env_var(CLIENT_ID_ENV_VAR),
             user_pool_id=env_var(USER_POOL_ID_ENV_VAR),
-            cognito=boto3.client(
-                'cognito-idp',
-                region_name=env_var(REGION_ENV_VAR),
-            )
+            region=env_var(REGION_ENV_VAR),
         )
 
+    @property
+    def cognito(self):
+        return self._get_client()
+
+    def _get_client(self):
+        # The client is created on first use so that functions which never
+        # call Cognito, such as the authorizer, do not pay for it.
+        if self._cognito is None:
+            self._cognito = self._client_registry.get_client(self._region)
+        return self._cognito
+
     def _get_tokens(self, result):
         tokens = {}
         if 'IdToken' in result:
@@ -118,7 +226,11 @@ class CognitoLifecycle:
             return self._get_tokens(result)
         return result
 
+    @profiler.profile
     def register(self, username, password, properties):
+        return self._sign_up(self.cognito, username, password, properties)
+
+    def _sign_up(self, cognito, username, password, properties):
         user_attributes = [
             {
                 'Name': k,
@@ -126,7 +238,7 @@ class CognitoLifecycle:
             }
             for k, v in properties.items()
         ]
-        result = self._cognito.sign_up(
+        result = cognito.sign_up(
             Username=username,
             Password=password,
             UserAttributes=user_attributes,
@@ -134,16 +246,133 @@ class CognitoLifecycle:
         )
         return result
 
+    def register_many(self, users,
+                      max_workers=DEFAULT_BULK_REGISTER_MAX_WORKERS,
+                      rate=DEFAULT_BULK_REGISTER_RATE):
+        """Register ``(username, password, properties)`` tuples concurrently.
+
+        At most ``max_workers`` sign ups are in flight and no more than
+        ``rate`` are started per second. Results are returned in the same
+        order as ``users``. Failed sign ups have an ``error`` with the
+        Cognito error code, its message and the status code the
+        ``/register`` route would have returned.
+        """
+        users = list(users)
+        if not users:
+            return []
+        limiter = RateLimiter(rate)
+        # The client is created before fanning out so the workers share it.
+        cognito = self._get_client()
+
+        def register_one(user):
+            username, password, properties = user
+            limiter.acquire()
+            try:
+                result = self._sign_up(cognito, username, password, properties)
+            except ClientError as e:
+                error = {
+                    'Code': e.response['Error']['Code'],
+                    'Message': e.response['Error']['Message'],
+                    'StatusCode': map_client_error(e).STATUS_CODE,
+                }
+            except ParamValidationError as e:
+                error = {
+                    'Code': e.__class__.__name__,
+                    'Message': str(e),
+                    'StatusCode': BadRequestError.STATUS_CODE,
+                }
+            except BotoCoreError as e:
+                error = {
+                    'Code': e.__class__.__name__,
+                    'Message': str(e),
+                    'StatusCode': ChaliceViewError.STATUS_CODE,
+                }
+            else:
+                return {'username': username, 'result': result}
+            return {'username': username, 'error': error}
+
+        workers = min(max_workers, len(users))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(register_one, users))
+
+    def _list_users_page(self, cognito, pagination_token, page_size):
+        kwargs = {}
+        if pagination_token is not None:
+            kwargs['PaginationToken'] = pagination_token
+        result = cognito.list_users(
+            UserPoolId=self._user_pool_id,
+            Limit=page_size,
+            **kwargs
+        )
+        return result['Users'], result.get('PaginationToken')
+
+    def iter_user_pages(self, pagination_token=None,
+                        page_size=LIST_USERS_PAGE_SIZE, prefetch=True,
+                        max_pages=None):
+        """Yield ``(users, pagination_token)`` for each page of users.
+
+        The token yielded with a page resumes the listing after it, and is
+        ``None`` on the last page. With ``prefetch`` the next page is
+        requested while the caller handles the current one, so at most two
+        pages are held in memory.
+        """
+        cognito = self._get_client()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            fetched = 0
+            future = executor.submit(
+                self._list_users_page, cognito, pagination_token, page_size)
+            while future is not None:
+                users, pagination_token = future.result()
+                fetched += 1
+                future = None
+                has_next = pagination_token is not None and (
+                    max_pages is None or fetched < max_pages)
+                if has_next and prefetch:
+                    future = executor.submit(
+                        self._list_users_page, cognito, pagination_token,
+                        page_size,
+                    )
+                yield users, pagination_token
+                if has_next and not prefetch:
+                    future = executor.submit(
+                        self._list_users_page, cognito, pagination_token,
+                        page_size,
+                    )
+
+    def iter_users(self, pagination_token=None,
+                   page_size=LIST_USERS_PAGE_SIZE, prefetch=True):
+        for users, _ in self.iter_user_pages(
+                pagination_token, page_size, prefetch):
+            for user in users:
+                yield user
+
+    def export_users(self, fileobj, pagination_token=None,
+                     page_size=LIST_USERS_PAGE_SIZE, prefetch=True,
+                     max_pages=None):
+        """Write users to ``fileobj`` as newline delimited JSON.
+
+        Returns the pagination token to resume the export from, or ``None``
+        once every user has been written.
+        """
+        for users, pagination_token in self.iter_user_pages(
+                pagination_token, page_size, prefetch, max_pages):
+            for user in users:
+                fileobj.write(user_to_json(user))
+                fileobj.write('\n')
+        return pagination_token
+
+    @profiler.profile
     def confirm(self, username, code):
-        result = self._cognito.confirm_sign_up(
+        result = self.cognito.confirm_sign_up(
             ConfirmationCode=code,
             Username=username,
             ClientId=self._app_client_id,
         )
         return result
 
+    @profiler.profile
     def login(self, username, password):
-        result = self._cognito.initiate_auth(
+        result = self.cognito.initiate_auth(
             AuthFlow='USER_PASSWORD_AUTH',
             AuthParameters={
                 'USERNAME': username,
@@ -153,8 +382,9 @@ class CognitoLifecycle:
         )
         return self._handle_auth_attempt(result)
 
+    @profiler.profile
     def auth_challenge(self, challenge, session, params):
-        result = self._cognito.respond_to_auth_challenge(
+        result = self.cognito.respond_to_auth_challenge(
             ChallengeName=challenge,
             Session=session,
             ChallengeResponses=params,
@@ -162,8 +392,9 @@ class CognitoLifecycle:
         )
         return self._handle_auth_attempt(result)
 
+    @profiler.profile
     def refresh(self, refresh_token):
-        result = self._cognito.initiate_auth(
+        result = self.cognito.initiate_auth(
             AuthFlow='REFRESH_TOKEN_AUTH',
             AuthParameters={
                 'REFRESH_TOKEN': refresh_token,
@@ -174,3 +405,14 @@ class CognitoLifecycle:
         if 'AccessToken' in result:
             return self._get_tokens(result)
         return result
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError('%r is not JSON serializable' % value)
+
+
+def user_to_json(user):
+    return json.dumps(
+        user, default=_json_default, separators=(',', ':'), sort_keys=True)
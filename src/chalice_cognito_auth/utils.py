@@ -1,4 +1,6 @@
 import os
+import time
+import threading
 from collections import namedtuple
 from typing import Dict
 
@@ -28,11 +30,15 @@ def get_param(body, key, required=False, default=None):
         raise BadRequestError('Missing requred parameter: %s' % key)
 
 
-def client_error_to_chalice_error(e):
+def map_client_error(e):
     code = e.response['Error']['Code']
     message = e.response['Error']['Message']
     error = CODE_TO_ERROR.get(code, DEFAULT_ERROR)
-    raise error.cls(error.fmt_str.format(code=code, message=message))
+    return error.cls(error.fmt_str.format(code=code, message=message))
+
+
+def client_error_to_chalice_error(e):
+    raise map_client_error(e)
 
 
 def handle_client_errors(fn):
@@ -62,3 +68,49 @@ def is_running_on_lambda(env: Dict[str, str] = os.environ):
     if execution_env is None:
         return False
     return execution_env.startswith('AWS_Lambda')
+
+
+class RateLimiter:
+    """RateLimiter
+
+    A token bucket that allows ``rate`` acquisitions per second with bursts
+    of up to ``burst``.
+    """
+    def __init__(self, rate, burst=None, now=None, sleep=None):
+        self._rate = rate
+        if burst is None:
+            burst = max(rate, 1)
+        self._burst = burst
+        self._tokens = burst
+        if now is None:
+            now = time.monotonic
+        self._now = now
+        if sleep is None:
+            sleep = time.sleep
+        self._sleep = sleep
+        self._last = now()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._now()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def try_acquire(self):
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            self._sleep(wait)
@@ -1,6 +1,17 @@
+import os
+
 import pytest
 
 
+KEY_PATH = os.path.join(os.path.dirname(__file__), 'mykey.pem')
+
+
+@pytest.fixture
+def private_key():
+    with open(KEY_PATH) as f:
+        return f.read()
+
+
 @pytest.fixture
 def create_event():
     def create_event_inner(uri, method, path, content_type='application/json'):
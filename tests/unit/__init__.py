@@ -8,6 +8,17 @@ from chalice_cognito_auth.blueprint import BlueprintFactory
 from chalice_cognito_auth.userpool import UserPoolHandlerFactory
 
 
+class FakeClock:
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
 @pytest.fixture
 def sample_app():
     demo = app.Chalice('app-name')
@@ -2,14 +2,20 @@ import mock
 import pytest
 
 from chalice.app import AuthRequest
+from chalice.app import AuthResponse
+from chalice.app import AuthRoute
 
 from chalice_cognito_auth.authorizer import RouteSelector
 from chalice_cognito_auth.authorizer import PrincipalSelector
 from chalice_cognito_auth.authorizer import AllRoutes
+from chalice_cognito_auth.authorizer import CachedAuthResponse
+from chalice_cognito_auth.authorizer import GroupRouteSelector
 from chalice_cognito_auth.authorizer import UsernameSelector
 from chalice_cognito_auth.authorizer import UserPoolAuthorizer
+from chalice_cognito_auth.cache import InMemoryCache
 from chalice_cognito_auth.decoder import TokenDecoder
 from chalice_cognito_auth.exceptions import InvalidToken
+from chalice_cognito_auth.fakecognito import FakeCognito
 
 
 class TestUserPoolAuthorizer():
@@ -75,6 +81,19 @@ class TestUserPoolAuthorizer():
         route_selector.get_allowed_routes.assert_not_called()
         principal_selector.get_principal.assert_not_called()
 
+    def test_can_authorize_token(self):
+        claims = {'cognito:username': 'username'}
+        decoder = mock.Mock(spec=TokenDecoder)
+        decoder.decode.return_value = claims
+        authorizer = UserPoolAuthorizer(decoder)
+
+        routes, principal_id, result = authorizer.authorize('token')
+
+        assert routes == ['*']
+        assert principal_id == 'username'
+        assert result == claims
+        decoder.decode.assert_called_with('token')
+
 
 def test_all_routes_route_selector():
     selector = AllRoutes()
@@ -82,13 +101,169 @@ def test_all_routes_route_selector():
     assert result == ['*']
 
 
+class TestGroupRouteSelector:
+    def test_can_select_routes_by_group(self):
+        selector = GroupRouteSelector(
+            group_routes={
+                'admin': ['/admin', '/users'],
+                'user': ['/users'],
+            },
+        )
+        claims = {'cognito:groups': ['user', 'admin']}
+        assert selector.get_allowed_routes(claims) == ('/admin', '/users')
+
+    def test_can_select_routes_by_scope(self):
+        selector = GroupRouteSelector(
+            group_routes={'admin': ['/admin']},
+            scope_routes={'users/read': ['/users']},
+        )
+        claims = {'scope': 'openid users/read'}
+        assert selector.get_allowed_routes(claims) == ('/users',)
+
+    def test_can_combine_groups_and_scopes(self):
+        selector = GroupRouteSelector(
+            group_routes={'admin': ['/admin']},
+            scope_routes={'users/read': ['/users']},
+        )
+        claims = {'cognito:groups': ['admin'], 'scope': 'users/read'}
+        assert selector.get_allowed_routes(claims) == ('/admin', '/users')
+
+    def test_can_select_routes_by_access_token_scope(self, private_key):
+        cognito = FakeCognito(private_key=private_key)
+        cognito.add_user('john', 'secret')
+        tokens = cognito.create_lifecycle().login('john', 'secret')
+        decoder = TokenDecoder(
+            cognito.create_key_fetcher(), cognito.app_client_id)
+        selector = GroupRouteSelector(
+            group_routes={'admin': ['/admin']},
+            scope_routes={'aws.cognito.signin.user.admin': ['/profile']},
+        )
+        authorizer = UserPoolAuthorizer(decoder, route_selector=selector)
+
+        routes, principal_id, _ = authorizer.authorize(
+            tokens['access_token'])
+
+        assert routes == ('/profile',)
+        assert principal_id == 'john'
+
+    def test_does_allow_nothing_without_matching_claims(self):
+        selector = GroupRouteSelector(group_routes={'admin': ['/admin']})
+        claims = {'cognito:groups': ['other'], 'scope': 'openid'}
+        assert selector.get_allowed_routes(claims) == ()
+
+    def test_does_memoize_routes_per_group_set(self):
+        selector = GroupRouteSelector(
+            group_routes={'admin': ['/admin'], 'user': ['/users']},
+        )
+        first = selector.get_allowed_routes(
+            {'cognito:groups': ['admin', 'user', 'unknown']})
+        second = selector.get_allowed_routes(
+            {'cognito:groups': ['user', 'admin']})
+        assert first is second
+
+    def test_does_deduplicate_auth_routes(self):
+        selector = GroupRouteSelector(
+            group_routes={
+                'a': [AuthRoute('/foo', ['GET'])],
+                'b': [AuthRoute('/foo', ['GET'])],
+            },
+        )
+        routes = selector.get_allowed_routes({'cognito:groups': ['a', 'b']})
+        assert len(routes) == 1
+        assert routes[0].path == '/foo'
+
+
 def test_username_principal_selector():
     selector = UsernameSelector()
     result = selector.get_principal({'cognito:username': 'john'})
     assert result == 'john'
 
 
+def test_username_principal_selector_can_use_access_token():
+    selector = UsernameSelector()
+    result = selector.get_principal({'username': 'john'})
+    assert result == 'john'
+
+
 def test_username_principal_selector_returns_none_if_key_missing():
     selector = UsernameSelector()
     result = selector.get_principal({})
     assert result is None
+
+
+METHOD_ARN = (
+    'arn:aws:execute-api:us-west-2:123:api-id/stage/GET/needs/auth'
+)
+
+
+def create_auth_request(method_arn=METHOD_ARN):
+    return AuthRequest('TOKEN', 'token', method_arn)
+
+
+class TestCachedAuthResponse:
+    def test_does_match_chalice_policy(self):
+        routes = ['*', '/foo', AuthRoute('/bar', ['GET', 'POST'])]
+        request = create_auth_request()
+        response = CachedAuthResponse(
+            routes, 'user', policy_cache=InMemoryCache())
+        assert response.to_dict(request) == AuthResponse(
+            routes, 'user').to_dict(request)
+
+    def test_does_share_policy_between_principals(self):
+        cache = InMemoryCache()
+        request = create_auth_request()
+        first = CachedAuthResponse(
+            [AuthRoute('/foo', ['GET'])], 'alice', policy_cache=cache,
+        ).to_dict(request)
+        second = CachedAuthResponse(
+            [AuthRoute('/foo', ['GET'])], 'bob', policy_cache=cache,
+        ).to_dict(request)
+
+        assert first['principalId'] == 'alice'
+        assert second['principalId'] == 'bob'
+        assert first['policyDocument'] == second['policyDocument']
+        assert len(cache) == 1
+
+    def test_does_not_share_mutable_policy(self):
+        cache = InMemoryCache()
+        request = create_auth_request()
+        first = CachedAuthResponse(
+            ['/foo'], 'alice', policy_cache=cache).to_dict(request)
+        first['policyDocument']['Statement'][0]['Resource'].append('*')
+        first['policyDocument']['Statement'].clear()
+
+        second = CachedAuthResponse(
+            ['/foo'], 'bob', policy_cache=cache).to_dict(request)
+        assert second['policyDocument']['Statement'][0]['Resource'] == [
+            'arn:aws:execute-api:us-west-2:123:api-id/stage/*/foo']
+
+    def test_does_cache_per_stage(self):
+        cache = InMemoryCache()
+        other_arn = METHOD_ARN.replace('/stage/', '/other/')
+        for arn in (METHOD_ARN, other_arn):
+            policy = CachedAuthResponse(
+                ['/foo'], 'user', policy_cache=cache,
+            ).to_dict(create_auth_request(arn))['policyDocument']
+        assert policy['Statement'][0]['Resource'] == [
+            'arn:aws:execute-api:us-west-2:123:api-id/other/*/foo']
+        assert len(cache) == 2
+
+    def test_does_collapse_routes_allowing_all_methods(self):
+        route = AuthRoute('/foo', list(AuthResponse.ALL_HTTP_METHODS))
+        policy = CachedAuthResponse(
+            [route], 'user', policy_cache=InMemoryCache(),
+        ).to_dict(create_auth_request())['policyDocument']
+        assert policy['Statement'][0]['Resource'] == [
+            'arn:aws:execute-api:us-west-2:123:api-id/stage/*/foo']
+
+    def test_auth_handler_does_share_policy_cache(self):
+        decoder = mock.Mock(spec=TokenDecoder)
+        decoder.decode.return_value = {'cognito:username': 'username'}
+        cache = InMemoryCache()
+        authorizer = UserPoolAuthorizer(decoder, policy_cache=cache)
+        request = create_auth_request()
+
+        for _ in range(3):
+            authorizer.auth_handler(request).to_dict(request)
+
+        assert len(cache) == 1
@@ -0,0 +1,241 @@
+import json
+import itertools
+from io import StringIO
+
+import mock
+import pytest
+from chalice import Chalice
+
+from chalice_cognito_auth.authorizer import UserPoolAuthorizer
+from chalice_cognito_auth.blueprint import BlueprintFactory
+from chalice_cognito_auth.decoder import KeyFetcher
+from chalice_cognito_auth.exceptions import InvalidToken
+from chalice_cognito_auth.userpool import CognitoLifecycle
+
+
+_names = itertools.count()
+
+
+def unique_name():
+    return 'BlueprintTestAuth%s' % next(_names)
+
+
+@pytest.fixture
+def lifecycle():
+    return mock.Mock(spec=CognitoLifecycle)
+
+
+class TestBulkRegister:
+    @pytest.fixture
+    def authorizer(self):
+        authorizer = mock.Mock(spec=UserPoolAuthorizer)
+        authorizer.get_claims.return_value = {'cognito:groups': ['admin']}
+        return authorizer
+
+    @pytest.fixture
+    def app(self, lifecycle, authorizer):
+        app = Chalice('app')
+        blueprint, _ = BlueprintFactory().create_blueprint(
+            unique_name(), authorizer, lifecycle, bulk_register=['admin'])
+        app.register_blueprint(blueprint)
+        return app
+
+    def call(self, app, create_event, body, token='token'):
+        event = create_event('/register/bulk', 'POST', {})
+        event['body'] = json.dumps(body)
+        if token is not None:
+            event['headers']['Authorization'] = token
+        response = app(event, context=None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_is_not_registered_by_default(self, lifecycle):
+        app = Chalice('app')
+        blueprint, _ = BlueprintFactory().create_blueprint(
+            unique_name(), mock.Mock(), lifecycle)
+        app.register_blueprint(blueprint)
+        assert '/register/bulk' not in app.routes
+
+    def test_is_protected_by_authorizer(self, app):
+        route = app.routes['/register/bulk']['POST']
+        assert route.authorizer is not None
+
+    @pytest.mark.parametrize('bulk_register', [True, [], 'admin'])
+    def test_does_require_groups(self, lifecycle, bulk_register):
+        with pytest.raises(ValueError):
+            BlueprintFactory().create_blueprint(
+                unique_name(), mock.Mock(), lifecycle,
+                bulk_register=bulk_register)
+
+    def test_does_reject_missing_token(self, app, lifecycle, create_event):
+        status, _ = self.call(
+            app, create_event, {'users': []}, token=None)
+        assert status == 401
+        lifecycle.register_many.assert_not_called()
+
+    def test_does_reject_users_outside_groups(
+            self, app, authorizer, lifecycle, create_event):
+        authorizer.get_claims.return_value = {'cognito:groups': ['support']}
+        status, _ = self.call(app, create_event, {'users': []})
+        assert status == 403
+        lifecycle.register_many.assert_not_called()
+
+    def test_can_register_users(self, app, lifecycle, create_event):
+        lifecycle.register_many.return_value = [{'username': 'foo'}]
+        status, body = self.call(app, create_event, {'users': [
+            {'username': 'foo', 'password': 'bar', 'email': 'foo@bar.com'},
+        ]})
+        assert status == 200
+        assert body == {'results': [{'username': 'foo'}]}
+        lifecycle.register_many.assert_called_once_with([
+            ('foo', 'bar', {'email': 'foo@bar.com'}),
+        ])
+
+    def test_does_reject_missing_password(
+            self, app, lifecycle, create_event):
+        status, _ = self.call(
+            app, create_event, {'users': [{'username': 'foo'}]})
+        assert status == 400
+        lifecycle.register_many.assert_not_called()
+
+    def test_does_reject_too_many_users(self, app, lifecycle, create_event):
+        users = [{'username': 'u', 'password': 'p'}] * 501
+        status, _ = self.call(app, create_event, {'users': users})
+        assert status == 400
+        lifecycle.register_many.assert_not_called()
+
+
+class TestUsersExport:
+    @pytest.fixture
+    def authorizer(self):
+        authorizer = mock.Mock(spec=UserPoolAuthorizer)
+        authorizer.get_claims.return_value = {'cognito:groups': ['admin']}
+        return authorizer
+
+    @pytest.fixture
+    def app(self, lifecycle, authorizer):
+        app = Chalice('app')
+        blueprint, _ = BlueprintFactory().create_blueprint(
+            unique_name(), authorizer, lifecycle, export_users=['admin'])
+        app.register_blueprint(blueprint)
+        return app
+
+    def call(self, app, create_event, query=None, token='token'):
+        event = create_event('/users/export', 'GET', {})
+        if token is not None:
+            event['headers']['Authorization'] = token
+        if query is not None:
+            event['multiValueQueryStringParameters'] = {
+                k: [v] for k, v in query.items()}
+        return app(event, context=None)
+
+    def test_is_protected_by_authorizer(self, app):
+        route = app.routes['/users/export']['GET']
+        assert route.authorizer is not None
+
+    @pytest.mark.parametrize('export_users', [True, [], 'admin'])
+    def test_does_require_groups(self, lifecycle, export_users):
+        with pytest.raises(ValueError):
+            BlueprintFactory().create_blueprint(
+                unique_name(), mock.Mock(), lifecycle,
+                export_users=export_users)
+
+    def test_does_reject_missing_token(self, app, lifecycle, create_event):
+        response = self.call(app, create_event, token=None)
+        assert response['statusCode'] == 401
+        lifecycle.export_users.assert_not_called()
+
+    def test_does_reject_invalid_token(
+            self, app, authorizer, lifecycle, create_event):
+        authorizer.get_claims.side_effect = InvalidToken()
+        response = self.call(app, create_event)
+        assert response['statusCode'] == 401
+        lifecycle.export_users.assert_not_called()
+
+    def test_does_reject_users_outside_groups(
+            self, app, authorizer, lifecycle, create_event):
+        authorizer.get_claims.return_value = {'cognito:groups': ['support']}
+        response = self.call(app, create_event)
+        assert response['statusCode'] == 403
+        lifecycle.export_users.assert_not_called()
+
+    def test_can_export_page(self, app, lifecycle, create_event):
+        def export_users(fileobj, pagination_token, max_pages):
+            fileobj.write('{"Username":"a"}\n')
+            return 'next'
+        lifecycle.export_users.side_effect = export_users
+
+        response = self.call(
+            app, create_event, {'pagination_token': 'start', 'limit': '61'})
+
+        assert response['statusCode'] == 200
+        assert response['body'] == '{"Username":"a"}\n'
+        assert response['headers']['Pagination-Token'] == 'next'
+        assert response['headers']['Content-Type'] == 'application/x-ndjson'
+        lifecycle.export_users.assert_called_once_with(
+            mock.ANY, 'start', max_pages=2)
+
+    def test_does_omit_token_on_last_page(
+            self, app, lifecycle, create_event):
+        lifecycle.export_users.return_value = None
+        response = self.call(app, create_event)
+        assert 'Pagination-Token' not in response['headers']
+
+    def test_does_reject_invalid_limit(self, app, lifecycle, create_event):
+        assert self.call(
+            app, create_event, {'limit': 'lots'})['statusCode'] == 400
+        assert self.call(
+            app, create_event, {'limit': '100000'})['statusCode'] == 400
+        lifecycle.export_users.assert_not_called()
+
+
+class TestJwks:
+    @pytest.fixture
+    def key_fetcher(self):
+        urlopen = mock.Mock(side_effect=[
+            StringIO('{"keys": [{"kid": "a"}]}'),
+            StringIO('{"keys": [{"kid": "b"}]}'),
+        ])
+        return KeyFetcher('mars-west-1', 'id', urlopen=urlopen)
+
+    @pytest.fixture
+    def call(self, lifecycle, key_fetcher, create_event):
+        app = Chalice('app')
+        blueprint, _ = BlueprintFactory().create_blueprint(
+            unique_name(), mock.Mock(), lifecycle, key_fetcher=key_fetcher)
+        app.register_blueprint(blueprint)
+
+        def call(if_none_match=None):
+            event = create_event('/.well-known/jwks.json', 'GET', {})
+            if if_none_match is not None:
+                event['headers']['If-None-Match'] = if_none_match
+            return app(event, context=None)
+        return call
+
+    def test_can_serve_keys(self, call, key_fetcher):
+        response = call()
+        assert response['statusCode'] == 200
+        assert json.loads(response['body']) == {'keys': [{'kid': 'a'}]}
+        assert response['headers']['ETag'] == key_fetcher.get_document()[1]
+        assert response['headers']['Cache-Control'] == 'public, max-age=300'
+
+    def test_does_return_not_modified(self, call):
+        etag = call()['headers']['ETag']
+        response = call(if_none_match='"other", %s' % etag)
+        assert response['statusCode'] == 304
+        assert response['body'] == ''
+        assert response['headers']['ETag'] == etag
+
+    def test_does_reflect_refreshed_keys(self, call, key_fetcher):
+        etag = call()['headers']['ETag']
+        key_fetcher.refresh()
+        response = call(if_none_match=etag)
+        assert response['statusCode'] == 200
+        assert json.loads(response['body']) == {'keys': [{'kid': 'b'}]}
+        assert response['headers']['ETag'] != etag
+
+    def test_is_not_registered_by_default(self, lifecycle):
+        app = Chalice('app')
+        blueprint, _ = BlueprintFactory().create_blueprint(
+            unique_name(), mock.Mock(), lifecycle)
+        app.register_blueprint(blueprint)
+        assert '/.well-known/jwks.json' not in app.routes
@@ -0,0 +1,47 @@
+from chalice_cognito_auth.cache import InMemoryCache
+from chalice_cognito_auth.cache import token_digest
+
+from tests.unit import FakeClock
+
+
+class TestInMemoryCache:
+    def test_can_get_value(self):
+        cache = InMemoryCache(now=FakeClock())
+        cache.set('key', 'value', 10)
+        assert cache.get('key') == 'value'
+
+    def test_does_return_none_for_missing_key(self):
+        cache = InMemoryCache(now=FakeClock())
+        assert cache.get('key') is None
+
+    def test_does_expire_entries(self):
+        clock = FakeClock()
+        cache = InMemoryCache(now=clock)
+        cache.set('key', 'value', 10)
+        clock.now = 10
+        assert cache.get('key') is None
+        assert len(cache) == 0
+
+    def test_does_evict_least_recently_used(self):
+        cache = InMemoryCache(max_size=2, now=FakeClock())
+        cache.set('a', 1, 10)
+        cache.set('b', 2, 10)
+        cache.get('a')
+        cache.set('c', 3, 10)
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+
+    def test_can_delete_and_clear(self):
+        cache = InMemoryCache(now=FakeClock())
+        cache.set('a', 1, 10)
+        cache.set('b', 2, 10)
+        cache.delete('a')
+        assert cache.get('a') is None
+        cache.clear()
+        assert len(cache) == 0
+
+
+def test_token_digest_is_stable():
+    assert token_digest('token') == token_digest('token')
+    assert token_digest('token') != token_digest('other')
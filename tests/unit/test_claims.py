@@ -0,0 +1,80 @@
+import base64
+import json
+
+import pytest
+
+from chalice_cognito_auth.claims import Claims
+from chalice_cognito_auth.claims import get_groups
+from chalice_cognito_auth.claims import get_scopes
+
+
+def test_can_get_groups():
+    claims = {'cognito:groups': ['admin', 'user']}
+    assert get_groups(claims) == frozenset(['admin', 'user'])
+
+
+def test_get_groups_returns_empty_set_if_missing():
+    assert get_groups({}) == frozenset()
+
+
+def test_can_get_scopes():
+    claims = {'scope': 'openid users/read'}
+    assert get_scopes(claims) == frozenset(['openid', 'users/read'])
+
+
+def test_get_scopes_returns_empty_set_if_missing():
+    assert get_scopes({}) == frozenset()
+
+
+class TestClaims:
+    PAYLOAD = json.dumps({
+        'exp': 3600,
+        'aud': 'client_id',
+        'cognito:username': 'john',
+        'cognito:groups': ['admin'],
+        'scope': 'openid users/read',
+        'custom:team': 'blue',
+    }).encode('utf-8')
+
+    def test_can_get_eager_claims_without_loading_payload(self):
+        claims = Claims(self.PAYLOAD)
+        assert claims['exp'] == 3600
+        assert claims['aud'] == 'client_id'
+        assert claims.get('cognito:username') == 'john'
+        assert get_groups(claims) == frozenset(['admin'])
+        assert get_scopes(claims) == frozenset(['openid', 'users/read'])
+        assert claims._claims is None
+
+    def test_can_get_lazy_claims(self):
+        claims = Claims(self.PAYLOAD)
+        assert claims['custom:team'] == 'blue'
+        assert claims._payload is None
+
+    def test_does_raise_key_error_for_missing_claims(self):
+        claims = Claims(self.PAYLOAD)
+        with pytest.raises(KeyError):
+            claims['iss']
+        with pytest.raises(KeyError):
+            claims['custom:other']
+        assert claims.get('iss') is None
+        assert 'iss' not in claims
+
+    def test_is_dict_compatible(self):
+        claims = Claims(self.PAYLOAD)
+        assert claims == json.loads(self.PAYLOAD)
+        assert dict(claims) == json.loads(self.PAYLOAD)
+        assert len(claims) == 6
+
+    def test_does_not_have_instance_dict(self):
+        claims = Claims(self.PAYLOAD)
+        assert not hasattr(claims, '__dict__')
+
+    def test_can_create_from_token(self):
+        payload = base64.urlsafe_b64encode(self.PAYLOAD).rstrip(b'=')
+        token = 'header.%s.signature' % payload.decode('utf-8')
+        claims = Claims.from_token(token)
+        assert claims['cognito:username'] == 'john'
+
+    def test_does_reject_non_object_payload(self):
+        with pytest.raises(ValueError):
+            Claims(b'[]')
@@ -0,0 +1,27 @@
+from chalice_cognito_auth.clients import ClientRegistry
+
+
+class TestClientRegistry:
+    def test_does_share_client_per_region(self):
+        registry = ClientRegistry()
+        first = registry.get_client('us-west-2')
+        second = registry.get_client('us-west-2')
+        assert first is second
+        assert first.meta.region_name == 'us-west-2'
+
+    def test_does_create_client_per_region(self):
+        registry = ClientRegistry()
+        west = registry.get_client('us-west-2')
+        east = registry.get_client('us-east-1')
+        assert west is not east
+        assert east.meta.region_name == 'us-east-1'
+
+    def test_can_configure_pool_size(self):
+        registry = ClientRegistry(max_pool_connections=3)
+        client = registry.get_client('us-west-2')
+        assert client.meta.config.max_pool_connections == 3
+
+    def test_can_create_from_env(self, monkeypatch):
+        monkeypatch.setenv('COGNITO_MAX_POOL_CONNECTIONS', '7')
+        client = ClientRegistry.from_env().get_client('us-west-2')
+        assert client.meta.config.max_pool_connections == 7
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import subprocess
+
+import mock
+
+from chalice_cognito_auth.coldstart import ColdStartTimer
+
+from tests.unit import FakeClock
+
+
+# Modules loaded by the authorizer Lambda, including the ones app.py uses
+# to create the user pool handler.
+AUTHORIZER_MODULES = [
+    'chalice_cognito_auth.blueprint',
+    'chalice_cognito_auth.authorizer',
+    'chalice_cognito_auth.userpool',
+]
+# Packages that must not be imported on the authorizer path.
+FORBIDDEN_PACKAGES = ['boto3']
+# Every third party top level package the authorizer path may import.
+# Private extension modules such as _cffi_backend belong to these packages
+# and are not listed.
+AUTHORIZER_PACKAGES = {
+    'botocore',
+    'chalice',
+    'chalice_cognito_auth',
+    'cryptography',
+    'jose',
+}
+# Upper bound for the wall clock time of importing AUTHORIZER_MODULES,
+# including every dependency, in microseconds. The fastest of
+# IMPORT_ATTEMPTS runs is compared, to smooth out noise from other
+# processes.
+AUTHORIZER_IMPORT_BUDGET = 250000
+IMPORT_ATTEMPTS = 3
+IMPORT_SCRIPT = """
+import sys, json, time
+before = set(sys.modules)
+start = time.perf_counter()
+import %s
+elapsed = time.perf_counter() - start
+packages = {name.split('.')[0] for name in set(sys.modules) - before}
+print(json.dumps({
+    'elapsed_us': int(elapsed * 1000000),
+    'packages': sorted(
+        name for name in packages
+        if name not in sys.stdlib_module_names and not name.startswith('_')
+    ),
+}))
+"""
+
+
+def subprocess_env(**extra):
+    # Creating a Chalice app sets AWS_EXECUTION_ENV in os.environ, which
+    # would make the child process think it is running on Lambda.
+    env = dict(os.environ, **extra)
+    env.pop('AWS_EXECUTION_ENV', None)
+    return env
+
+
+def import_profile(modules):
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT % ', '.join(modules)],
+        env=subprocess_env(), stdout=subprocess.PIPE, check=True,
+        universal_newlines=True,
+    ).stdout
+    return json.loads(output)
+
+
+class TestColdStartTimer:
+    def test_can_record_phases(self):
+        clock = FakeClock()
+        timer = ColdStartTimer(clock=clock)
+        with timer.phase('outer'):
+            clock.now = 1
+            with timer.phase('inner'):
+                clock.now = 3
+        assert timer.phases == {'outer': 3, 'inner': 2}
+
+    def test_does_emit_once(self):
+        logger = mock.Mock()
+        clock = FakeClock()
+        timer = ColdStartTimer(enabled=True, clock=clock, logger=logger)
+        with timer.phase('init'):
+            clock.now = 0.5
+        timer.emit()
+        timer.emit()
+
+        assert logger.info.call_count == 1
+        data = json.loads(logger.info.call_args[0][0])
+        assert data == {
+            'cold_start': {
+                'total_ms': 500.0,
+                'phases_ms': {'init': 500.0},
+            },
+        }
+
+    def test_does_not_emit_inside_phase(self):
+        logger = mock.Mock()
+        timer = ColdStartTimer(enabled=True, logger=logger)
+
+        @timer.timed('inner')
+        def inner():
+            pass
+
+        with timer.phase('outer'):
+            inner()
+        logger.info.assert_not_called()
+        timer.emit()
+        assert logger.info.call_count == 1
+
+    def test_does_not_emit_when_disabled(self):
+        logger = mock.Mock()
+        timer = ColdStartTimer(enabled=False, logger=logger)
+        timer.emit()
+        logger.info.assert_not_called()
+
+    def test_can_time_imports(self, tmpdir, monkeypatch):
+        tmpdir.mkdir('probe').join('__init__.py').write('from . import sub\n')
+        tmpdir.join('probe', 'sub.py').write('VALUE = 1\n')
+        monkeypatch.syspath_prepend(str(tmpdir))
+        timer = ColdStartTimer()
+        original_meta_path = list(sys.meta_path)
+        try:
+            timer.install_import_hook(['probe'])
+            import probe
+        finally:
+            sys.meta_path[:] = original_meta_path
+            sys.modules.pop('probe', None)
+            sys.modules.pop('probe.sub', None)
+        assert probe.sub.VALUE == 1
+        assert list(timer.phases) == ['import:probe']
+
+    def test_can_create_from_env(self):
+        env = {'CHALICE_COGNITO_AUTH_COLD_START_TIMING': '1'}
+        assert ColdStartTimer.from_env(env).enabled
+        assert not ColdStartTimer.from_env({}).enabled
+
+
+def test_authorizer_import_does_not_load_forbidden_packages():
+    packages = import_profile(AUTHORIZER_MODULES)['packages']
+    for package in FORBIDDEN_PACKAGES:
+        assert package not in packages
+
+
+def test_authorizer_import_loads_only_expected_packages():
+    packages = import_profile(AUTHORIZER_MODULES)['packages']
+    assert set(packages) == AUTHORIZER_PACKAGES
+
+
+def test_authorizer_import_is_within_budget():
+    elapsed = min(
+        import_profile(AUTHORIZER_MODULES)['elapsed_us']
+        for _ in range(IMPORT_ATTEMPTS)
+    )
+    assert elapsed < AUTHORIZER_IMPORT_BUDGET
+
+
+def test_can_emit_cold_start_summary():
+    env = subprocess_env(CHALICE_COGNITO_AUTH_COLD_START_TIMING='1')
+    script = (
+        'import logging; logging.basicConfig(format="%(message)s");'
+        'import chalice_cognito_auth.userpool as u;'
+        'u.UserPoolHandlerFactory().create_user_pool_handler('
+        '"client", "pool", region="us-east-1", name="N")'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', script], env=env, stderr=subprocess.PIPE,
+        check=True, universal_newlines=True,
+    ).stderr
+    data = json.loads(output.strip().splitlines()[-1])
+    phases = data['cold_start']['phases_ms']
+    assert 'create_user_pool_handler' in phases
+    assert 'import:chalice' in phases
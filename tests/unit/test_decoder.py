@@ -3,9 +3,11 @@ from io import StringIO
 
 import pytest
 
+from chalice_cognito_auth.cache import InMemoryCache
 from chalice_cognito_auth.decoder import KeyFetcher
 from chalice_cognito_auth.decoder import TokenDecoder
 from chalice_cognito_auth.exceptions import InvalidToken
+from chalice_cognito_auth.revocation import RevocationChecker
 
 
 # JWT Token
@@ -126,6 +128,99 @@ class TestTokenDecoder:
             decoder.decode(JWT_TOKEN)
         assert str(e.value) == 'Could not find kid key'
 
+    def test_does_refresh_keys_on_unknown_kid(self):
+        mock_fetcher = mock.Mock(spec=KeyFetcher)
+        mock_fetcher.get_keys.side_effect = [
+            [{"kid": "old"}],
+            [{
+                "kid": "key",
+                "kty": "RSA",
+                "alg": "RS256",
+                "n":  JWT_N,
+                "e": "AQAB",
+            }],
+        ]
+        decoder = TokenDecoder(mock_fetcher, 'client_id', now=lambda: 0)
+        assert decoder.decode(JWT_TOKEN)['name'] == 'john'
+        mock_fetcher.refresh.assert_called_once_with()
+
+    def test_does_rate_limit_key_refreshes(self):
+        clock = mock.Mock(return_value=0)
+        mock_fetcher = mock.Mock(spec=KeyFetcher)
+        mock_fetcher.get_keys.return_value = []
+        decoder = TokenDecoder(
+            mock_fetcher, 'client_id', now=clock, keys_refresh_interval=60)
+        for _ in range(3):
+            with pytest.raises(InvalidToken):
+                decoder.decode(JWT_TOKEN)
+        assert mock_fetcher.refresh.call_count == 1
+
+        clock.return_value = 60
+        with pytest.raises(InvalidToken):
+            decoder.decode(JWT_TOKEN)
+        assert mock_fetcher.refresh.call_count == 2
+
+    def test_does_use_cache_for_repeated_token(self):
+        mock_fetcher = mock.Mock(spec=KeyFetcher)
+        mock_fetcher.get_keys.return_value = [
+            {
+                "kid": "key",
+                "kty": "RSA",
+                "alg": "RS256",
+                "n":  JWT_N,
+                "e": "AQAB",
+            }
+        ]
+        cache = InMemoryCache(now=lambda: 0)
+        decoder = TokenDecoder(
+            mock_fetcher, 'client_id', now=lambda: 0, cache=cache)
+        first = decoder.decode(JWT_TOKEN)
+        second = decoder.decode(JWT_TOKEN)
+        assert first is second
+        assert mock_fetcher.get_keys.call_count == 1
+
+    def test_does_raise_error_on_revoked_token(self):
+        mock_fetcher = mock.Mock(spec=KeyFetcher)
+        mock_fetcher.get_keys.return_value = [
+            {
+                "kid": "key",
+                "kty": "RSA",
+                "alg": "RS256",
+                "n":  JWT_N,
+                "e": "AQAB",
+            }
+        ]
+        checker = mock.Mock(spec=RevocationChecker)
+        checker.is_revoked.return_value = True
+        decoder = TokenDecoder(
+            mock_fetcher, 'client_id', now=lambda: 0,
+            revocation_checker=checker,
+        )
+        with pytest.raises(InvalidToken) as e:
+            decoder.decode(JWT_TOKEN)
+        assert str(e.value) == 'Token revoked'
+
+    def test_does_raise_error_when_revocation_check_fails(self):
+        mock_fetcher = mock.Mock(spec=KeyFetcher)
+        mock_fetcher.get_keys.return_value = [
+            {
+                "kid": "key",
+                "kty": "RSA",
+                "alg": "RS256",
+                "n":  JWT_N,
+                "e": "AQAB",
+            }
+        ]
+        checker = mock.Mock(spec=RevocationChecker)
+        checker.is_revoked.side_effect = Exception()
+        decoder = TokenDecoder(
+            mock_fetcher, 'client_id', now=lambda: 0,
+            revocation_checker=checker,
+        )
+        with pytest.raises(InvalidToken) as e:
+            decoder.decode(JWT_TOKEN)
+        assert str(e.value) == 'Error checking token revocation'
+
 
 class TestKeyFetcher:
     def test_can_fetch_keys(self):
@@ -155,3 +250,78 @@ class TestKeyFetcher:
         )
         assert keys_first == ['keya', 'keyb']
         assert keys_second == ['keya', 'keyb']
+
+    def test_can_share_keys_through_cache(self):
+        cache = InMemoryCache(now=lambda: 0)
+        for _ in range(2):
+            mock_urlopen = mock.Mock()
+            mock_urlopen.return_value = StringIO('{"keys": ["keya"]}')
+            fetcher = KeyFetcher(
+                'mars-west-1', 'id', urlopen=mock_urlopen, cache=cache,
+                now=lambda: 0,
+            )
+            assert fetcher.get_keys() == ['keya']
+        mock_urlopen.assert_not_called()
+
+    def test_does_refetch_keys_after_cache_max_age(self):
+        cache = InMemoryCache(now=lambda: 3600)
+        cache.set(
+            'https://cognito-idp.mars-west-1.amazonaws.com/id/.well-known/'
+            'jwks.json', ['old'], 3600,
+        )
+        mock_urlopen = mock.Mock()
+        mock_urlopen.return_value = StringIO('{"keys": ["new"]}')
+        fetcher = KeyFetcher(
+            'mars-west-1', 'id', urlopen=mock_urlopen, cache=cache,
+            now=lambda: 3600,
+        )
+        assert fetcher.get_keys() == ['new']
+        assert cache.get(
+            'https://cognito-idp.mars-west-1.amazonaws.com/id/.well-known/'
+            'jwks.json') == ['new']
+
+    def test_does_refetch_keys_after_max_age(self):
+        clock = mock.Mock(return_value=0)
+        mock_urlopen = mock.Mock(side_effect=[
+            StringIO('{"keys": ["old"]}'), StringIO('{"keys": ["new"]}'),
+        ])
+        fetcher = KeyFetcher(
+            'mars-west-1', 'id', urlopen=mock_urlopen, max_age=60, now=clock)
+        assert fetcher.get_keys() == ['old']
+        clock.return_value = 59
+        assert fetcher.get_keys() == ['old']
+        clock.return_value = 60
+        assert fetcher.get_keys() == ['new']
+
+    def test_can_refresh_keys(self):
+        cache = InMemoryCache(now=lambda: 0)
+        mock_urlopen = mock.Mock(side_effect=[
+            StringIO('{"keys": ["old"]}'), StringIO('{"keys": ["new"]}'),
+        ])
+        fetcher = KeyFetcher(
+            'mars-west-1', 'id', urlopen=mock_urlopen, cache=cache,
+            now=lambda: 0,
+        )
+        assert fetcher.get_keys() == ['old']
+        assert fetcher.refresh() == ['new']
+        assert fetcher.get_keys() == ['new']
+        assert cache.get(
+            'https://cognito-idp.mars-west-1.amazonaws.com/id/.well-known/'
+            'jwks.json') == ['new']
+
+    def test_can_get_document(self):
+        mock_urlopen = mock.Mock(side_effect=[
+            StringIO('{"keys": [{"kid": "a", "alg": "RS256"}]}'),
+            StringIO('{"keys": [{"kid": "b"}]}'),
+        ])
+        fetcher = KeyFetcher('mars-west-1', 'id', urlopen=mock_urlopen)
+
+        body, etag = fetcher.get_document()
+        assert body == '{"keys":[{"alg":"RS256","kid":"a"}]}'
+        assert etag.startswith('"') and etag.endswith('"')
+        assert fetcher.get_document() == (body, etag)
+
+        fetcher.refresh()
+        new_body, new_etag = fetcher.get_document()
+        assert new_body == '{"keys":[{"kid":"b"}]}'
+        assert new_etag != etag
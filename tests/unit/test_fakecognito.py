@@ -0,0 +1,158 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from chalice_cognito_auth.decoder import TokenDecoder
+from chalice_cognito_auth.exceptions import ChallengeError
+from chalice_cognito_auth.exceptions import InvalidToken
+from chalice_cognito_auth.fakecognito import FakeCognito
+
+from tests.unit import FakeClock
+
+
+@pytest.fixture
+def cognito(private_key):
+    return FakeCognito(private_key=private_key)
+
+
+def error_code(error):
+    return error.value.response['Error']['Code']
+
+
+class TestFakeCognito:
+    def test_can_register_confirm_and_login(self, cognito):
+        lifecycle = cognito.create_lifecycle()
+        lifecycle.register('john', 'secret', {'email': 'john@example.com'})
+        lifecycle.confirm('john', '123456')
+        tokens = lifecycle.login('john', 'secret')
+
+        decoder = TokenDecoder(
+            cognito.create_key_fetcher(), cognito.app_client_id)
+        claims = decoder.decode(tokens['id_token'])
+        assert claims['cognito:username'] == 'john'
+        assert claims['email'] == 'john@example.com'
+        assert claims['iss'] == cognito.issuer
+        assert tokens['token_type'] == 'Bearer'
+        assert 'refresh_token' in tokens
+
+    def test_can_refresh(self, cognito):
+        cognito.add_user('john', 'secret', groups=['admin'])
+        lifecycle = cognito.create_lifecycle()
+        tokens = lifecycle.login('john', 'secret')
+        refreshed = lifecycle.refresh(tokens['refresh_token'])
+
+        decoder = TokenDecoder(
+            cognito.create_key_fetcher(), cognito.app_client_id)
+        claims = decoder.decode(refreshed['id_token'])
+        assert claims['cognito:groups'] == ['admin']
+        assert 'refresh_token' not in refreshed
+
+    def test_can_decode_access_token(self, cognito):
+        cognito.add_user('john', 'secret', groups=['admin'])
+        tokens = cognito.create_lifecycle().login('john', 'secret')
+
+        decoder = TokenDecoder(
+            cognito.create_key_fetcher(), cognito.app_client_id)
+        claims = decoder.decode(tokens['access_token'])
+        assert claims['token_use'] == 'access'
+        assert claims['client_id'] == cognito.app_client_id
+        assert claims['username'] == 'john'
+        assert claims['cognito:groups'] == ['admin']
+
+    def test_does_reject_access_token_for_other_client(self, cognito):
+        cognito.add_user('john', 'secret')
+        tokens = cognito.create_lifecycle().login('john', 'secret')
+
+        decoder = TokenDecoder(cognito.create_key_fetcher(), 'other_client')
+        with pytest.raises(InvalidToken) as e:
+            decoder.decode(tokens['access_token'])
+        assert str(e.value) == 'Token was not issued for this audience'
+
+    def test_can_respond_to_new_password_challenge(self, cognito):
+        cognito.add_user('john', 'temporary', temporary_password=True)
+        lifecycle = cognito.create_lifecycle()
+        with pytest.raises(ChallengeError) as e:
+            lifecycle.login('john', 'temporary')
+        assert e.value.challenge == 'NEW_PASSWORD_REQUIRED'
+
+        tokens = lifecycle.auth_challenge(
+            e.value.challenge, e.value.session,
+            {'USERNAME': 'john', 'NEW_PASSWORD': 'secret'},
+        )
+        assert 'id_token' in tokens
+        assert 'id_token' in lifecycle.login('john', 'secret')
+
+    def test_does_reject_wrong_password(self, cognito):
+        cognito.add_user('john', 'secret')
+        with pytest.raises(ClientError) as e:
+            cognito.create_lifecycle().login('john', 'wrong')
+        assert error_code(e) == 'NotAuthorizedException'
+
+    def test_does_reject_unknown_user(self, cognito):
+        with pytest.raises(ClientError) as e:
+            cognito.create_lifecycle().login('john', 'secret')
+        assert error_code(e) == 'UserNotFoundException'
+
+    def test_does_reject_unconfirmed_user(self, cognito):
+        cognito.add_user('john', 'secret', confirmed=False)
+        with pytest.raises(ClientError) as e:
+            cognito.create_lifecycle().login('john', 'secret')
+        assert error_code(e) == 'UserNotConfirmedException'
+
+    def test_does_reject_duplicate_sign_up(self, cognito):
+        lifecycle = cognito.create_lifecycle()
+        lifecycle.register('john', 'secret', {})
+        with pytest.raises(ClientError) as e:
+            lifecycle.register('john', 'secret', {})
+        assert error_code(e) == 'UsernameExistsException'
+
+    def test_does_reject_wrong_confirmation_code(self, cognito):
+        lifecycle = cognito.create_lifecycle()
+        lifecycle.register('john', 'secret', {})
+        with pytest.raises(ClientError) as e:
+            lifecycle.confirm('john', 'wrong')
+        assert error_code(e) == 'CodeMismatchException'
+
+    def test_does_issue_tokens_with_configured_ttl(self, private_key):
+        cognito = FakeCognito(
+            private_key=private_key, token_ttl=60, now=FakeClock(1000))
+        cognito.add_user('john', 'secret')
+        tokens = cognito.create_lifecycle().login('john', 'secret')
+        decoder = TokenDecoder(
+            cognito.create_key_fetcher(), cognito.app_client_id,
+            now=FakeClock(1060),
+        )
+        assert decoder.decode(tokens['id_token'])['exp'] == 1060
+        decoder = TokenDecoder(
+            cognito.create_key_fetcher(), cognito.app_client_id,
+            now=FakeClock(1061),
+        )
+        with pytest.raises(Exception):
+            decoder.decode(tokens['id_token'])
+
+    def test_can_simulate_latency(self, private_key):
+        sleeps = []
+        cognito = FakeCognito(
+            private_key=private_key, latency=0.25, sleep=sleeps.append)
+        cognito.add_user('john', 'secret')
+        cognito.create_lifecycle().login('john', 'secret')
+        assert sleeps == [0.25]
+
+    def test_can_throttle(self, private_key):
+        cognito = FakeCognito(private_key=private_key, max_rps=2)
+        cognito.add_user('john', 'secret')
+        lifecycle = cognito.create_lifecycle()
+        lifecycle.login('john', 'secret')
+        lifecycle.login('john', 'secret')
+        with pytest.raises(ClientError) as e:
+            lifecycle.login('john', 'secret')
+        assert error_code(e) == 'TooManyRequestsException'
+
+    def test_can_serve_jwks(self, cognito):
+        keys = cognito.create_key_fetcher().get_keys()
+        assert keys[0]['kid'] == 'local'
+        assert keys[0]['alg'] == 'RS256'
+        assert 'd' not in keys[0]
+
+    def test_does_reject_unknown_jwks_url(self, cognito):
+        with pytest.raises(ValueError):
+            cognito.urlopen('https://example.com/jwks.json')
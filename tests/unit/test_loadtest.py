@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from chalice_cognito_auth.fakecognito import FakeCognito
+from chalice_cognito_auth.loadtest import main
+from chalice_cognito_auth.loadtest import parse_mix
+from chalice_cognito_auth.loadtest import percentile
+from chalice_cognito_auth.loadtest import run_load_test
+
+
+@pytest.fixture
+def cognito(private_key):
+    return FakeCognito(private_key=private_key)
+
+
+def test_can_run_load_test(cognito):
+    report = run_load_test(cognito, workers=2, requests=50, seed=0)
+
+    assert report['config']['workers'] == 2
+    assert report['overall']['count'] == 50
+    assert report['overall']['errors'] == 0
+    assert set(report['operations']) == {
+        'login', 'refresh', 'authorized_valid', 'authorized_expired',
+        'authorized_forged',
+    }
+    expired = report['operations']['authorized_expired']
+    assert expired['status_codes'] == {'403': expired['count']}
+    latency = report['overall']['latency_ms']
+    assert latency['p50'] <= latency['p95'] <= latency['p99'] <= latency['max']
+
+
+def test_does_count_throttled_calls_as_errors(private_key):
+    cognito = FakeCognito(private_key=private_key, max_rps=0.001)
+    report = run_load_test(cognito, workers=1, requests=20, mix={'login': 1})
+
+    assert report['overall']['errors'] == 20
+    assert report['overall']['error_rate'] == 1.0
+    assert report['operations']['login']['status_codes'] == {'500': 20}
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) is None
+
+
+def test_parse_mix():
+    assert parse_mix('login=1,refresh=2') == {'login': 1.0, 'refresh': 2.0}
+
+
+def test_main_writes_json_report(tmpdir, monkeypatch, cognito):
+    monkeypatch.setattr(
+        'chalice_cognito_auth.loadtest.FakeCognito',
+        lambda **kwargs: cognito,
+    )
+    output = str(tmpdir.join('report.json'))
+    main(['--workers', '1', '--requests', '10', '--output', output])
+    with open(output) as f:
+        report = json.load(f)
+    assert report['overall']['count'] == 10
@@ -0,0 +1,163 @@
+import json
+import functools
+
+import mock
+import pytest
+
+from chalice import AuthRoute
+from chalice import Blueprint
+from chalice import Chalice
+
+from chalice_cognito_auth.authorizer import UserPoolAuthorizer
+from chalice_cognito_auth.exceptions import InvalidToken
+from chalice_cognito_auth.middleware import LocalAuthMiddleware
+from chalice_cognito_auth.middleware import get_request_path
+from chalice_cognito_auth.middleware import is_route_allowed
+
+
+@pytest.fixture
+def authorizer():
+    return mock.Mock(spec=UserPoolAuthorizer)
+
+
+def wrap(view):
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@pytest.fixture
+def sample_app(authorizer):
+    app = Chalice('local-auth')
+    middleware = LocalAuthMiddleware(authorizer)
+    routes = Blueprint(__name__)
+    middleware.register(routes)
+
+    @app.route('/protected')
+    @middleware.protect
+    def protected():
+        return app.current_request.context['authorizer']
+
+    @app.route('/users/{user_id}')
+    @middleware.protect
+    def user(user_id):
+        return {'user_id': user_id}
+
+    @app.route('/wrapped-inside')
+    @wrap
+    @middleware.protect
+    def wrapped_inside():
+        return {'ok': True}
+
+    @app.route('/wrapped-outside')
+    @middleware.protect
+    @wrap
+    def wrapped_outside():
+        return {'ok': True}
+
+    @app.route('/open')
+    def open_route():
+        return {'open': True}
+
+    app.register_blueprint(routes)
+    return app
+
+
+def call(app, create_event, path, token=None, uri_params=None):
+    event = create_event(path, 'GET', uri_params or {})
+    if token is not None:
+        event['headers']['Authorization'] = token
+    response = app(event, context=None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+class TestLocalAuthMiddleware:
+    def test_can_authorize_protected_route(
+            self, sample_app, authorizer, create_event):
+        claims = {'cognito:username': 'john'}
+        authorizer.authorize.return_value = (['*'], 'john', claims)
+
+        status, body = call(sample_app, create_event, '/protected', 'token')
+
+        assert status == 200
+        assert body == {'principalId': 'john', 'claims': claims}
+        authorizer.authorize.assert_called_with('token')
+
+    def test_does_reject_missing_token(
+            self, sample_app, authorizer, create_event):
+        status, body = call(sample_app, create_event, '/protected')
+
+        assert status == 401
+        assert body == {'message': 'Unauthorized'}
+        authorizer.authorize.assert_not_called()
+
+    def test_does_reject_invalid_token(
+            self, sample_app, authorizer, create_event):
+        authorizer.authorize.side_effect = InvalidToken()
+
+        status, body = call(sample_app, create_event, '/protected', 'token')
+
+        assert status == 403
+        assert body == {
+            'Message': 'User is not authorized to access this resource'}
+
+    def test_does_reject_disallowed_route(
+            self, sample_app, authorizer, create_event):
+        authorizer.authorize.return_value = (['/other'], 'john', {})
+
+        status, body = call(sample_app, create_event, '/protected', 'token')
+
+        assert status == 403
+
+    def test_does_not_check_unprotected_route(
+            self, sample_app, authorizer, create_event):
+        status, body = call(sample_app, create_event, '/open')
+
+        assert status == 200
+        assert body == {'open': True}
+        authorizer.authorize.assert_not_called()
+
+    def test_does_match_requested_path_of_parameterized_route(
+            self, sample_app, authorizer, create_event):
+        authorizer.authorize.return_value = (['/users/42'], 'john', {})
+
+        status, body = call(
+            sample_app, create_event, '/users/{user_id}', 'token',
+            uri_params={'user_id': '42'})
+        assert status == 200
+        assert body == {'user_id': '42'}
+
+        status, _ = call(
+            sample_app, create_event, '/users/{user_id}', 'token',
+            uri_params={'user_id': '43'})
+        assert status == 403
+
+    @pytest.mark.parametrize('path', ['/wrapped-inside', '/wrapped-outside'])
+    def test_does_check_routes_of_wrapped_views(
+            self, sample_app, authorizer, create_event, path):
+        authorizer.authorize.return_value = (['/other'], 'john', {})
+        status, _ = call(sample_app, create_event, path, 'token')
+        assert status == 403
+        authorizer.authorize.assert_called_with('token')
+
+
+def test_can_get_request_path():
+    assert get_request_path('/users/{id}', {'id': '42'}) == '/users/42'
+    assert get_request_path('/files/{path+}', {'path': 'a/b'}) == '/files/a/b'
+    assert get_request_path('/users', None) == '/users'
+
+
+def test_is_route_allowed_with_wildcard():
+    assert is_route_allowed(['*'], '/foo', 'GET')
+
+
+def test_is_route_allowed_with_path_pattern():
+    assert is_route_allowed(['/foo/*'], '/foo/1', 'GET')
+    assert not is_route_allowed(['/foo/*'], '/bar', 'GET')
+
+
+def test_is_route_allowed_with_auth_route_methods():
+    routes = [AuthRoute('/foo', ['POST'])]
+    assert is_route_allowed(routes, '/foo', 'POST')
+    assert not is_route_allowed(routes, '/foo', 'GET')
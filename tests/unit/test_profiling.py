@@ -0,0 +1,94 @@
+import json
+import tracemalloc
+
+import mock
+
+from chalice_cognito_auth.profiling import SamplingProfiler
+
+
+def work(n):
+    return sum(range(n))
+
+
+class TestSamplingProfiler:
+    def test_does_not_wrap_when_disabled(self):
+        profiler = SamplingProfiler(sample_rate=0)
+        assert profiler.profile(work) is work
+
+    def test_does_log_summary_after_report_every_samples(self):
+        logger = mock.Mock()
+        profiler = SamplingProfiler(
+            sample_rate=1, report_every=2, top_n=3, logger=logger)
+        profiled = profiler.profile(work)
+
+        assert profiled(10) == 45
+        logger.info.assert_not_called()
+        assert profiled(10) == 45
+
+        summary = json.loads(logger.info.call_args[0][0])
+        assert summary['profile'] == 'work'
+        assert summary['samples'] == 2
+        assert 0 < len(summary['top']) <= 3
+        assert set(summary['top'][0]) == {
+            'function', 'calls', 'tottime', 'cumtime'}
+
+    def test_does_skip_unsampled_calls(self):
+        logger = mock.Mock()
+        profiler = SamplingProfiler(
+            sample_rate=0.1, report_every=1, logger=logger,
+            rand=lambda: 0.5,
+        )
+        assert profiler.profile(work)(10) == 45
+        logger.info.assert_not_called()
+
+    def test_can_profile_nested_calls(self):
+        logger = mock.Mock()
+        profiler = SamplingProfiler(
+            sample_rate=1, report_every=1, logger=logger)
+        inner = profiler.profile(work)
+
+        @profiler.profile
+        def outer():
+            return inner(10)
+
+        assert outer() == 45
+        assert logger.info.call_count == 1
+
+    def test_can_trace_memory(self):
+        logger = mock.Mock()
+        profiler = SamplingProfiler(
+            sample_rate=1, report_every=1, trace_memory=True, logger=logger)
+
+        @profiler.profile
+        def allocate():
+            return [object() for _ in range(1000)]
+
+        allocate()
+        summary = json.loads(logger.info.call_args[0][0])
+        assert summary['memory']
+
+    def test_does_stop_tracing_after_sampled_call(self):
+        profiler = SamplingProfiler(
+            sample_rate=1, report_every=1, trace_memory=True,
+            logger=mock.Mock(),
+        )
+        profiler.profile(work)(10)
+        assert not tracemalloc.is_tracing()
+
+    def test_does_not_stop_tracing_started_elsewhere(self):
+        profiler = SamplingProfiler(
+            sample_rate=1, report_every=1, trace_memory=True,
+            logger=mock.Mock(),
+        )
+        tracemalloc.start()
+        try:
+            profiler.profile(work)(10)
+            assert tracemalloc.is_tracing()
+        finally:
+            tracemalloc.stop()
+
+    def test_can_create_from_env(self, monkeypatch):
+        monkeypatch.setenv('CHALICE_COGNITO_AUTH_PROFILE_SAMPLE_RATE', '0.5')
+        monkeypatch.setenv('CHALICE_COGNITO_AUTH_PROFILE_TOP_N', '5')
+        profiler = SamplingProfiler.from_env()
+        assert profiler.enabled
@@ -0,0 +1,157 @@
+import threading
+
+import mock
+import pytest
+
+from chalice_cognito_auth.exceptions import RevocationListUnavailableError
+from chalice_cognito_auth.revocation import BloomFilter
+from chalice_cognito_auth.revocation import RevocationChecker
+from chalice_cognito_auth.revocation import RevocationStore
+from chalice_cognito_auth.revocation import SQLiteRevocationStore
+
+from tests.unit import FakeClock
+
+
+class TestBloomFilter:
+    def test_does_contain_added_values(self):
+        bloom_filter = BloomFilter(100)
+        for i in range(100):
+            bloom_filter.add('jti-%s' % i)
+        assert all('jti-%s' % i in bloom_filter for i in range(100))
+
+    def test_does_keep_false_positive_rate_low(self):
+        bloom_filter = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom_filter.add('revoked-%s' % i)
+        false_positives = sum(
+            'valid-%s' % i in bloom_filter for i in range(10000))
+        assert false_positives < 300
+
+    def test_empty_filter_contains_nothing(self):
+        bloom_filter = BloomFilter(0)
+        assert 'jti' not in bloom_filter
+
+
+class TestSQLiteRevocationStore:
+    def test_can_revoke(self):
+        store = SQLiteRevocationStore(now=FakeClock())
+        store.revoke('jti', 10)
+        assert store.is_revoked('jti')
+        assert not store.is_revoked('other')
+        assert store.get_revoked() == ['jti']
+
+    def test_does_ignore_expired_entries(self):
+        clock = FakeClock()
+        store = SQLiteRevocationStore(now=clock)
+        store.revoke('jti', 10)
+        clock.now = 10
+        assert not store.is_revoked('jti')
+        assert store.get_revoked() == []
+
+    def test_can_persist_to_file(self, tmpdir):
+        path = str(tmpdir.join('revoked.db'))
+        SQLiteRevocationStore(path, now=FakeClock()).revoke('jti', 10)
+        assert SQLiteRevocationStore(path, now=FakeClock()).is_revoked('jti')
+
+
+class TestRevocationChecker:
+    def test_can_detect_revoked_jti(self):
+        store = SQLiteRevocationStore(now=FakeClock())
+        store.revoke('jti', 10)
+        checker = RevocationChecker(store, now=FakeClock())
+        assert checker.is_revoked({'jti': 'jti'})
+        assert not checker.is_revoked({'jti': 'other'})
+
+    def test_can_detect_revoked_origin_jti(self):
+        store = SQLiteRevocationStore(now=FakeClock())
+        store.revoke('origin', 10)
+        checker = RevocationChecker(store, now=FakeClock())
+        assert checker.is_revoked({'jti': 'jti', 'origin_jti': 'origin'})
+
+    def test_does_not_query_store_on_filter_miss(self):
+        store = mock.Mock(spec=RevocationStore)
+        store.get_revoked.return_value = ['revoked']
+        checker = RevocationChecker(store, now=FakeClock())
+        assert not checker.is_revoked({'jti': 'valid'})
+        store.is_revoked.assert_not_called()
+
+    def test_does_sync_periodically(self):
+        clock = FakeClock()
+        store = SQLiteRevocationStore(now=clock)
+        checker = RevocationChecker(store, sync_interval=60, now=clock)
+        assert not checker.is_revoked({'jti': 'jti'})
+        store.revoke('jti', 1000)
+        clock.now = 59
+        assert not checker.is_revoked({'jti': 'jti'})
+        clock.now = 60
+        assert checker.is_revoked({'jti': 'jti'})
+
+    def test_does_keep_filter_when_sync_fails(self):
+        clock = FakeClock()
+        store = mock.Mock(spec=RevocationStore)
+        store.get_revoked.return_value = ['revoked']
+        store.is_revoked.return_value = True
+        checker = RevocationChecker(
+            store, sync_interval=60, retry_interval=1, now=clock)
+        assert checker.is_revoked({'jti': 'revoked'})
+
+        store.get_revoked.side_effect = Exception('store is down')
+        clock.now = 60
+        assert checker.is_revoked({'jti': 'revoked'})
+        assert not checker.is_revoked({'jti': 'valid'})
+        assert store.get_revoked.call_count == 2
+
+        clock.now = 61
+        checker.is_revoked({'jti': 'valid'})
+        clock.now = 62
+        checker.is_revoked({'jti': 'valid'})
+        assert store.get_revoked.call_count == 3
+        clock.now = 63
+        checker.is_revoked({'jti': 'valid'})
+        assert store.get_revoked.call_count == 4
+
+    def test_does_fail_until_first_sync_succeeds(self):
+        clock = FakeClock()
+        store = mock.Mock(spec=RevocationStore)
+        store.get_revoked.side_effect = Exception('store is down')
+        checker = RevocationChecker(store, retry_interval=1, now=clock)
+        with pytest.raises(RevocationListUnavailableError):
+            checker.is_revoked({'jti': 'valid'})
+        with pytest.raises(RevocationListUnavailableError):
+            checker.is_revoked({'jti': 'valid'})
+        assert store.get_revoked.call_count == 1
+
+        store.get_revoked.side_effect = None
+        store.get_revoked.return_value = []
+        clock.now = 1
+        assert not checker.is_revoked({'jti': 'valid'})
+
+    def test_does_not_wait_for_sync_in_other_thread(self):
+        clock = FakeClock()
+        store = mock.Mock(spec=RevocationStore)
+        store.get_revoked.return_value = ['revoked']
+        store.is_revoked.return_value = True
+        checker = RevocationChecker(store, sync_interval=60, now=clock)
+        assert checker.is_revoked({'jti': 'revoked'})
+
+        syncing = threading.Event()
+        release = threading.Event()
+
+        def slow_get_revoked():
+            syncing.set()
+            release.wait(5)
+            return []
+
+        store.get_revoked.side_effect = slow_get_revoked
+        clock.now = 60
+        thread = threading.Thread(
+            target=checker.is_revoked, args=({'jti': 'revoked'},))
+        thread.start()
+        try:
+            assert syncing.wait(5)
+            assert checker.is_revoked({'jti': 'revoked'})
+            assert store.get_revoked.call_count == 2
+        finally:
+            release.set()
+            thread.join()
+        assert not checker.is_revoked({'jti': 'revoked'})
@@ -0,0 +1,82 @@
+import multiprocessing
+
+import pytest
+
+from chalice_cognito_auth.claims import Claims
+from chalice_cognito_auth.sharedcache import SharedMemoryCache
+
+from tests.unit import FakeClock
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('cache'))
+
+
+def write_entry(path, key, value):
+    cache = SharedMemoryCache(path, slots=16, slot_size=256)
+    cache.set(key, value, 2 ** 40)
+    cache.close()
+
+
+class TestSharedMemoryCache:
+    def test_can_get_value(self, path):
+        cache = SharedMemoryCache(path, slots=16, slot_size=256,
+                                  now=FakeClock())
+        cache.set('key', {'a': [1, 2]}, 10)
+        assert cache.get('key') == {'a': [1, 2]}
+        assert cache.get('other') is None
+
+    def test_can_use_bytes_keys(self, path):
+        cache = SharedMemoryCache(path, slots=16, slot_size=256,
+                                  now=FakeClock())
+        cache.set(b'\x00digest', 'value', 10)
+        assert cache.get(b'\x00digest') == 'value'
+
+    def test_does_expire_entries(self, path):
+        clock = FakeClock()
+        cache = SharedMemoryCache(path, slots=16, slot_size=256, now=clock)
+        cache.set('key', 'value', 10)
+        clock.now = 10
+        assert cache.get('key') is None
+        assert len(cache) == 0
+
+    def test_colliding_key_replaces_entry(self, path):
+        cache = SharedMemoryCache(path, slots=1, slot_size=256,
+                                  now=FakeClock())
+        cache.set('a', 1, 10)
+        cache.set('b', 2, 10)
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+
+    def test_does_not_cache_oversized_values(self, path):
+        cache = SharedMemoryCache(path, slots=16, slot_size=64,
+                                  now=FakeClock())
+        cache.set('key', 'x' * 100, 10)
+        assert cache.get('key') is None
+
+    def test_can_delete_and_clear(self, path):
+        cache = SharedMemoryCache(path, slots=16, slot_size=256,
+                                  now=FakeClock())
+        cache.set('a', 1, 10)
+        cache.set('b', 2, 10)
+        cache.delete('a')
+        assert cache.get('a') is None
+        assert len(cache) == 1
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_does_store_claims_as_dict(self, path):
+        cache = SharedMemoryCache(path, slots=16, slot_size=256,
+                                  now=FakeClock())
+        cache.set('key', Claims(b'{"exp": 10, "name": "john"}'), 10)
+        assert cache.get('key') == {'exp': 10, 'name': 'john'}
+
+    def test_can_share_entries_between_processes(self, path):
+        cache = SharedMemoryCache(path, slots=16, slot_size=256)
+        process = multiprocessing.Process(
+            target=write_entry, args=(path, 'key', 'from child'))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+        assert cache.get('key') == 'from child'
@@ -0,0 +1,244 @@
+import base64
+import json
+import threading
+import time
+
+import mock
+import pytest
+from botocore.exceptions import ClientError
+
+from chalice_cognito_auth.tokens import PasswordCredential
+from chalice_cognito_auth.tokens import RefreshTokenCredential
+from chalice_cognito_auth.tokens import TokenProvider
+from chalice_cognito_auth.userpool import CognitoLifecycle
+
+from tests.unit import FakeClock
+
+
+class FakeTimer:
+    created = []
+
+    def __init__(self, interval, function, args=()):
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.cancelled = False
+        FakeTimer.created.append(self)
+
+    def start(self):
+        pass
+
+    def cancel(self):
+        self.cancelled = True
+
+    def fire(self):
+        self.function(*self.args)
+
+
+def make_token(exp, name='token'):
+    payload = json.dumps({'exp': exp, 'name': name}).encode('utf-8')
+    payload = base64.urlsafe_b64encode(payload).rstrip(b'=').decode('utf-8')
+    return 'header.%s.signature' % payload
+
+
+@pytest.fixture
+def lifecycle():
+    return mock.Mock(spec=CognitoLifecycle)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def provider(lifecycle, clock):
+    FakeTimer.created = []
+    return TokenProvider(
+        lifecycle, refresh_margin=300, jitter=60, now=clock,
+        rand=lambda: 0.5, timer_factory=FakeTimer,
+    )
+
+
+class TestTokenProvider:
+    def test_does_cache_token(self, provider, lifecycle):
+        token = make_token(3600)
+        lifecycle.refresh.return_value = {'access_token': token}
+        credential = RefreshTokenCredential('refresh')
+
+        assert provider.get_token(credential) == token
+        assert provider.get_token(credential) == token
+        lifecycle.refresh.assert_called_once_with('refresh')
+
+    def test_does_schedule_refresh_before_expiry_with_jitter(
+            self, provider, lifecycle):
+        lifecycle.refresh.return_value = {'access_token': make_token(3600)}
+        provider.get_token(RefreshTokenCredential('refresh'))
+
+        assert FakeTimer.created[0].interval == 3600 - 300 - 30
+
+    def test_can_refresh_in_background(self, provider, lifecycle, clock):
+        first, second = make_token(3600, 'first'), make_token(7200, 'second')
+        lifecycle.refresh.side_effect = [
+            {'access_token': first}, {'access_token': second},
+        ]
+        credential = RefreshTokenCredential('refresh')
+        provider.get_token(credential)
+
+        FakeTimer.created[0].fire()
+
+        assert provider.get_token(credential) == second
+        assert lifecycle.refresh.call_count == 2
+        assert FakeTimer.created[1].interval == 7200 - 330
+
+    def test_does_serve_cached_token_while_refreshing(
+            self, provider, lifecycle, clock):
+        first = make_token(3600, 'first')
+        lifecycle.refresh.return_value = {'access_token': first}
+        credential = RefreshTokenCredential('refresh')
+        provider.get_token(credential)
+
+        release = threading.Event()
+        second = make_token(7200, 'second')
+
+        def slow_refresh(refresh_token):
+            release.wait(5)
+            return {'access_token': second}
+        lifecycle.refresh.side_effect = slow_refresh
+        clock.now = 3300
+
+        assert provider.get_token(credential) == first
+        assert provider.get_token(credential) == first
+        release.set()
+        for _ in range(100):
+            if provider.get_token(credential) == second:
+                break
+            time.sleep(0.01)
+        assert provider.get_token(credential) == second
+        assert lifecycle.refresh.call_count == 2
+
+    def test_does_fetch_synchronously_after_expiry(
+            self, provider, lifecycle, clock):
+        first, second = make_token(3600, 'first'), make_token(7200, 'second')
+        lifecycle.refresh.side_effect = [
+            {'access_token': first}, {'access_token': second},
+        ]
+        credential = RefreshTokenCredential('refresh')
+        provider.get_token(credential)
+        clock.now = 3600
+
+        assert provider.get_token(credential) == second
+
+    def test_does_allow_one_fetch_in_flight(self, provider, lifecycle):
+        token = make_token(3600)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_refresh(refresh_token):
+            started.set()
+            release.wait(5)
+            return {'access_token': token}
+        lifecycle.refresh.side_effect = slow_refresh
+        credential = RefreshTokenCredential('refresh')
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(provider.get_token(credential)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        started.wait(5)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert results == [token] * 5
+        assert lifecycle.refresh.call_count == 1
+
+    def test_does_raise_fetch_errors(self, provider, lifecycle):
+        lifecycle.refresh.side_effect = ClientError(
+            {'Error': {'Code': 'NotAuthorizedException', 'Message': 'm'}},
+            'InitiateAuth',
+        )
+        with pytest.raises(ClientError):
+            provider.get_token(RefreshTokenCredential('refresh'))
+
+    def test_can_provide_id_tokens(self, lifecycle, clock):
+        token = make_token(3600)
+        lifecycle.refresh.return_value = {
+            'access_token': make_token(3600, 'access'),
+            'id_token': token,
+        }
+        provider = TokenProvider(
+            lifecycle, token_use='id', now=clock, timer_factory=FakeTimer)
+        assert provider.get_token(RefreshTokenCredential('r')) == token
+
+    def test_does_start_one_background_refresh(
+            self, provider, lifecycle, clock):
+        lifecycle.refresh.return_value = {'access_token': make_token(3600)}
+        credential = RefreshTokenCredential('refresh')
+        provider.get_token(credential)
+        clock.now = 3300
+
+        with mock.patch('threading.Thread') as thread:
+            for _ in range(5):
+                provider.get_token(credential)
+
+        assert thread.call_count == 1
+
+    def test_does_back_off_after_failed_refresh(
+            self, provider, lifecycle, clock):
+        first = make_token(3600, 'first')
+        lifecycle.refresh.return_value = {'access_token': first}
+        credential = RefreshTokenCredential('refresh')
+        provider.get_token(credential)
+        lifecycle.refresh.side_effect = ClientError(
+            {'Error': {'Code': 'TooManyRequestsException', 'Message': 'm'}},
+            'InitiateAuth',
+        )
+        clock.now = 3300
+
+        FakeTimer.created[0].fire()
+        with mock.patch('threading.Thread') as thread:
+            assert provider.get_token(credential) == first
+            clock.now = 3304
+            assert provider.get_token(credential) == first
+            thread.assert_not_called()
+            clock.now = 3305
+            provider.get_token(credential)
+            assert thread.call_count == 1
+        assert lifecycle.refresh.call_count == 2
+
+    def test_close_cancels_timers(self, provider, lifecycle):
+        lifecycle.refresh.return_value = {'access_token': make_token(3600)}
+        provider.get_token(RefreshTokenCredential('refresh'))
+        provider.close()
+        assert FakeTimer.created[0].cancelled
+
+
+class TestPasswordCredential:
+    def test_does_login_then_refresh(self, lifecycle):
+        lifecycle.login.return_value = {
+            'access_token': 'a', 'refresh_token': 'r'}
+        lifecycle.refresh.return_value = {'access_token': 'b'}
+        credential = PasswordCredential('user', 'pass')
+
+        assert credential.fetch(lifecycle) == {
+            'access_token': 'a', 'refresh_token': 'r'}
+        assert credential.fetch(lifecycle) == {'access_token': 'b'}
+        lifecycle.login.assert_called_once_with('user', 'pass')
+        lifecycle.refresh.assert_called_once_with('r')
+
+    def test_does_login_again_when_refresh_fails(self, lifecycle):
+        lifecycle.login.return_value = {
+            'access_token': 'a', 'refresh_token': 'r'}
+        lifecycle.refresh.side_effect = ClientError(
+            {'Error': {'Code': 'NotAuthorizedException', 'Message': 'm'}},
+            'InitiateAuth',
+        )
+        credential = PasswordCredential('user', 'pass')
+        credential.fetch(lifecycle)
+
+        assert credential.fetch(lifecycle)['access_token'] == 'a'
+        assert lifecycle.login.call_count == 2
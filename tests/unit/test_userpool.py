@@ -1,6 +1,24 @@
+import io
+import json
+import time
+import datetime
+import threading
+
 import pytest
 import mock
+from botocore.exceptions import ClientError
+from botocore.exceptions import EndpointConnectionError
+from botocore.exceptions import ParamValidationError
+from chalice import Blueprint
+from chalice import Chalice
 
+from chalice_cognito_auth.authorizer import UserPoolAuthorizer
+from chalice_cognito_auth.claims import get_claim_sets
+from chalice_cognito_auth.clients import ClientRegistry
+from chalice_cognito_auth.decoder import TokenDecoder
+from chalice_cognito_auth.exceptions import InvalidToken
+from chalice_cognito_auth.fakecognito import FakeCognito
+from chalice_cognito_auth.middleware import LocalAuthMiddleware
 from chalice_cognito_auth.userpool import UserPoolHandlerFactory
 from chalice_cognito_auth.userpool import UserPoolHandler
 from chalice_cognito_auth.userpool import CognitoLifecycle
@@ -21,7 +39,352 @@ def test_can_create_handler():
     assert isinstance(handler, UserPoolHandler)
 
 
+def test_local_auth_returns_view_unchanged():
+    factory = UserPoolHandlerFactory()
+    handler = factory.create_user_pool_handler(
+        'client_id', 'pool_id', region='mars-west-1', name='LOCAL_AUTH')
+
+    def view():
+        pass
+
+    assert handler.local_auth(view) is view
+
+
+class TestRequires:
+    @pytest.fixture
+    def authorizer(self):
+        return mock.Mock(spec=UserPoolAuthorizer)
+
+    @pytest.fixture
+    def app(self, authorizer):
+        app = Chalice('requires')
+        blueprint = Blueprint(__name__)
+        handler = UserPoolHandler(authorizer, blueprint, None)
+
+        @app.route('/admin')
+        @handler.requires(groups=['admin', 'owner'], scopes=['users/read'])
+        def admin():
+            return {'ok': True}
+
+        app.register_blueprint(blueprint)
+        return app
+
+    def call(self, app, create_event, token='token'):
+        event = create_event('/admin', 'GET', {})
+        if token is not None:
+            event['headers']['Authorization'] = token
+        response = app(event, context=None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_can_allow_matching_claims(self, app, authorizer, create_event):
+        authorizer.get_claims.return_value = {
+            'exp': 2 ** 40,
+            'cognito:groups': ['owner'],
+            'scope': 'openid users/read',
+        }
+        status, body = self.call(app, create_event)
+        assert status == 200
+        assert body == {'ok': True}
+
+    def test_does_reject_missing_group(self, app, authorizer, create_event):
+        authorizer.get_claims.return_value = {
+            'exp': 2 ** 40,
+            'cognito:groups': ['user'],
+            'scope': 'users/read',
+        }
+        status, body = self.call(app, create_event)
+        assert status == 403
+        assert body['Message'] == 'Missing required group'
+
+    def test_does_reject_missing_scope(self, app, authorizer, create_event):
+        authorizer.get_claims.return_value = {
+            'exp': 2 ** 40,
+            'cognito:groups': ['admin'],
+            'scope': 'openid',
+        }
+        status, body = self.call(app, create_event)
+        assert status == 403
+        assert body['Message'] == 'Missing required scope'
+
+    def test_does_reject_invalid_token(self, app, authorizer, create_event):
+        authorizer.get_claims.side_effect = InvalidToken()
+        status, _ = self.call(app, create_event)
+        assert status == 401
+
+    def test_does_reject_missing_token(self, app, authorizer, create_event):
+        status, _ = self.call(app, create_event, token=None)
+        assert status == 401
+
+    def test_does_parse_claims_once_per_token(
+            self, app, authorizer, create_event):
+        authorizer.get_claims.return_value = {
+            'exp': 2 ** 40,
+            'cognito:groups': ['admin'],
+            'scope': 'users/read',
+        }
+        with mock.patch('chalice_cognito_auth.userpool.get_claim_sets',
+                        wraps=get_claim_sets) as parse:
+            self.call(app, create_event)
+            self.call(app, create_event)
+        assert parse.call_count == 1
+
+    def test_does_reject_revoked_token(self, app, authorizer, create_event):
+        authorizer.get_claims.side_effect = [
+            {
+                'exp': 2 ** 40,
+                'cognito:groups': ['admin'],
+                'scope': 'users/read',
+            },
+            InvalidToken('Token revoked'),
+        ]
+        status, _ = self.call(app, create_event)
+        assert status == 200
+        status, _ = self.call(app, create_event)
+        assert status == 401
+
+
+class SlowCognito:
+    def __init__(self, latency):
+        self._latency = latency
+
+    def sign_up(self, Username, Password, UserAttributes, ClientId):
+        time.sleep(self._latency)
+        if Username == 'taken':
+            raise ClientError(
+                {'Error': {
+                    'Code': 'UsernameExistsException',
+                    'Message': 'User already exists',
+                }},
+                'SignUp',
+            )
+        if Username == 'invalid':
+            raise ParamValidationError(report='Invalid type for parameter')
+        if Username == 'offline':
+            raise EndpointConnectionError(endpoint_url='https://cognito')
+        return {'UserConfirmed': False, 'UserSub': 'sub-%s' % Username}
+
+
+class PagedCognito:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+        self.called = threading.Event()
+
+    def list_users(self, UserPoolId, Limit, PaginationToken=None):
+        self.calls.append(PaginationToken)
+        if len(self.calls) > 1:
+            self.called.set()
+        index = int(PaginationToken or 0)
+        result = {'Users': self.pages[index]}
+        if index + 1 < len(self.pages):
+            result['PaginationToken'] = str(index + 1)
+        return result
+
+
+@pytest.fixture
+def paged_cognito():
+    return PagedCognito([
+        [{'Username': 'a'}, {'Username': 'b'}],
+        [{'Username': 'c'}],
+        [{'Username': 'd'}],
+    ])
+
+
+class TestRequiresWithLocalAuth:
+    @pytest.fixture
+    def authorizer(self):
+        authorizer = mock.Mock(spec=UserPoolAuthorizer)
+        claims = {'exp': 2 ** 40, 'cognito:groups': ['admin']}
+        authorizer.authorize.return_value = (['/other'], 'john', claims)
+        authorizer.get_claims.return_value = claims
+        return authorizer
+
+    @pytest.fixture
+    def app(self, authorizer):
+        app = Chalice('requires-local-auth')
+        middleware = LocalAuthMiddleware(authorizer)
+        blueprint = Blueprint(__name__)
+        middleware.register(blueprint)
+        handler = UserPoolHandler(
+            authorizer, blueprint, None, middleware=middleware)
+
+        @app.route('/local-auth-outermost')
+        @handler.local_auth
+        @handler.requires(groups=['admin'])
+        def local_auth_outermost():
+            return {'ok': True}
+
+        @app.route('/requires-outermost')
+        @handler.requires(groups=['admin'])
+        @handler.local_auth
+        def requires_outermost():
+            return {'ok': True}
+
+        app.register_blueprint(blueprint)
+        return app
+
+    @pytest.mark.parametrize(
+        'path', ['/local-auth-outermost', '/requires-outermost'])
+    def test_does_check_route_selector(self, app, create_event, path):
+        event = create_event(path, 'GET', {})
+        event['headers']['Authorization'] = 'token'
+        assert app(event, context=None)['statusCode'] == 403
+
+
+class TestCurrentClaimsWithLocalAuth:
+    def test_can_return_decoded_claims(self, private_key, create_event):
+        cognito = FakeCognito(private_key=private_key)
+        cognito.add_user('john', 'secret', groups=['admin'])
+        tokens = cognito.create_lifecycle().login('john', 'secret')
+        authorizer = UserPoolAuthorizer(TokenDecoder(
+            cognito.create_key_fetcher(), cognito.app_client_id))
+        middleware = LocalAuthMiddleware(authorizer)
+        blueprint = Blueprint(__name__)
+        middleware.register(blueprint)
+        handler = UserPoolHandler(
+            authorizer, blueprint, None, middleware=middleware)
+        app = Chalice('current-claims')
+
+        @app.route('/whoami')
+        @handler.local_auth
+        def whoami():
+            return {
+                'username': handler.current_user,
+                'claims': handler.current_claims,
+            }
+
+        app.register_blueprint(blueprint)
+        event = create_event('/whoami', 'GET', {})
+        event['headers']['Authorization'] = tokens['id_token']
+        response = app(event, context=None)
+
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['username'] == 'john'
+        assert body['claims']['cognito:username'] == 'john'
+        assert body['claims']['cognito:groups'] == ['admin']
+
+
 class TestCognitoLifecycle:
+    def test_does_create_client_lazily(self):
+        client_registry = mock.Mock(spec=ClientRegistry)
+        cognito = client_registry.get_client.return_value
+        cognito.initiate_auth.return_value = {
+            'AuthenticationResult': {'AccessToken': 'access'},
+        }
+        lifecycle = CognitoLifecycle(
+            'client_id', 'pool_id', region='mars-west-1',
+            client_registry=client_registry,
+        )
+        client_registry.get_client.assert_not_called()
+
+        lifecycle.login('foo', 'bar')
+        lifecycle.login('foo', 'bar')
+
+        client_registry.get_client.assert_called_once_with('mars-west-1')
+
+    def test_can_register_many(self):
+        lifecycle = CognitoLifecycle('client_id', 'pool_id', SlowCognito(0))
+        results = lifecycle.register_many([
+            ('foo', 'pass', {'email': 'foo@example.com'}),
+            ('taken', 'pass', {}),
+        ])
+        assert results == [
+            {
+                'username': 'foo',
+                'result': {'UserConfirmed': False, 'UserSub': 'sub-foo'},
+            },
+            {
+                'username': 'taken',
+                'error': {
+                    'Code': 'UsernameExistsException',
+                    'Message': 'User already exists',
+                    'StatusCode': 500,
+                },
+            },
+        ]
+
+    def test_does_report_botocore_errors_per_user(self):
+        lifecycle = CognitoLifecycle('client_id', 'pool_id', SlowCognito(0))
+        results = lifecycle.register_many([
+            ('invalid', 'pass', {'age': 3}),
+            ('offline', 'pass', {}),
+            ('foo', 'pass', {}),
+        ])
+        assert results[0]['error']['Code'] == 'ParamValidationError'
+        assert results[0]['error']['StatusCode'] == 400
+        assert results[1]['error']['Code'] == 'EndpointConnectionError'
+        assert results[1]['error']['StatusCode'] == 500
+        assert 'result' in results[2]
+
+    def test_does_register_many_concurrently(self):
+        latency = 0.05
+        users = [('user%s' % i, 'pass', {}) for i in range(40)]
+        lifecycle = CognitoLifecycle(
+            'client_id', 'pool_id', SlowCognito(latency))
+
+        start = time.perf_counter()
+        results = lifecycle.register_many(users, max_workers=10, rate=1000)
+        elapsed = time.perf_counter() - start
+
+        assert [r['username'] for r in results] == [u[0] for u in users]
+        assert all('result' in r for r in results)
+        assert elapsed < len(users) * latency / 3
+
+    def test_does_rate_limit_register_many(self):
+        users = [('user%s' % i, 'pass', {}) for i in range(15)]
+        lifecycle = CognitoLifecycle('client_id', 'pool_id', SlowCognito(0))
+
+        start = time.perf_counter()
+        lifecycle.register_many(users, max_workers=15, rate=10)
+
+        assert time.perf_counter() - start >= 0.4
+
+    def test_can_iter_users(self, paged_cognito):
+        lifecycle = CognitoLifecycle('client_id', 'pool_id', paged_cognito)
+        users = [u['Username'] for u in lifecycle.iter_users(page_size=2)]
+        assert users == ['a', 'b', 'c', 'd']
+        assert paged_cognito.calls == [None, '1', '2']
+
+    def test_does_prefetch_next_page(self, paged_cognito):
+        lifecycle = CognitoLifecycle('client_id', 'pool_id', paged_cognito)
+        pages = lifecycle.iter_user_pages()
+        assert next(pages) == ([{'Username': 'a'}, {'Username': 'b'}], '1')
+        assert paged_cognito.called.wait(5)
+        pages.close()
+
+    def test_does_not_prefetch_when_disabled(self, paged_cognito):
+        lifecycle = CognitoLifecycle('client_id', 'pool_id', paged_cognito)
+        pages = lifecycle.iter_user_pages(prefetch=False)
+        next(pages)
+        assert paged_cognito.calls == [None]
+        pages.close()
+
+    def test_can_resume_from_pagination_token(self, paged_cognito):
+        lifecycle = CognitoLifecycle('client_id', 'pool_id', paged_cognito)
+        users = [u['Username'] for u in lifecycle.iter_users('1')]
+        assert users == ['c', 'd']
+
+    def test_can_export_users(self, paged_cognito):
+        paged_cognito.pages[0][0]['UserCreateDate'] = datetime.datetime(
+            2020, 1, 2, 3, 4, 5)
+        lifecycle = CognitoLifecycle('client_id', 'pool_id', paged_cognito)
+        output = io.StringIO()
+
+        pagination_token = lifecycle.export_users(output, max_pages=2)
+
+        assert pagination_token == '2'
+        assert paged_cognito.calls == [None, '1']
+        assert [json.loads(line) for line in output.getvalue().splitlines()] \
+            == [
+                {'Username': 'a', 'UserCreateDate': '2020-01-02T03:04:05'},
+                {'Username': 'b'},
+                {'Username': 'c'},
+            ]
+        output = io.StringIO()
+        assert lifecycle.export_users(output, pagination_token) is None
+        assert output.getvalue() == '{"Username":"d"}\n'
+
     def test_can_login(self, cognito_lifecycle):
         cognito, lifecycle = cognito_lifecycle
         cognito.initiate_auth.return_value = {
@@ -0,0 +1,52 @@
+from botocore.exceptions import ClientError
+from chalice import ChaliceViewError
+from chalice import UnauthorizedError
+
+from chalice_cognito_auth.utils import map_client_error
+from chalice_cognito_auth.utils import RateLimiter
+
+from tests.unit import FakeClock
+
+
+class TestRateLimiter:
+    def test_does_allow_burst(self):
+        clock = FakeClock()
+        limiter = RateLimiter(2, burst=3, now=clock)
+        assert [limiter.try_acquire() for _ in range(4)] == [
+            True, True, True, False]
+
+    def test_does_refill_over_time(self):
+        clock = FakeClock()
+        limiter = RateLimiter(2, now=clock)
+        assert limiter.try_acquire()
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+        clock.now = 0.5
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+
+    def test_acquire_does_wait_for_token(self):
+        clock = FakeClock()
+        limiter = RateLimiter(4, burst=1, now=clock, sleep=clock.sleep)
+        limiter.acquire()
+        limiter.acquire()
+        assert clock.now == 0.25
+
+
+def create_client_error(code, message):
+    return ClientError(
+        {'Error': {'Code': code, 'Message': message}}, 'Operation')
+
+
+def test_map_client_error_does_map_known_codes():
+    error = map_client_error(
+        create_client_error('NotAuthorizedException', 'Bad password'))
+    assert isinstance(error, UnauthorizedError)
+    assert str(error) == 'Bad password'
+
+
+def test_map_client_error_does_default_to_view_error():
+    error = map_client_error(
+        create_client_error('InvalidPasswordException', 'Too short'))
+    assert type(error) is ChaliceViewError
+    assert str(error) == 'InvalidPasswordException: Too short'